@@ -1,5 +1,11 @@
 from enum import Enum
 
+# Newest entries kept in each user's materialized feed.
+FEED_MAX_ITEMS = 500
+# Posts by authors with more followers than this are not copied into every
+# follower's feed; they are merged into the feed when it is read instead.
+FANOUT_FOLLOWER_LIMIT = 10_000
+
 
 class UserRole(str, Enum):
     ADMIN = "admin"
@@ -12,3 +18,15 @@ class ReactionType(str, Enum):
     HAHA = "haha"
     HATE = "hate"
     SAD = "sad"
+
+
+class VersionedResource(str, Enum):
+    USERS = "users"
+    USERNAMES = "usernames"
+    FOLLOWS = "follows"
+
+
+class SearchKind(str, Enum):
+    POST = "post"
+    COMMENT = "comment"
+    REPLY = "reply"
@@ -1,3 +1,15 @@
-from .database import engine, db_dependency, Base
+from .database import engine, db_dependency, Base, SessionLocal
 from .base_class import Base
-from .models import Users, Posts, Reactions, Comments, CommentReply, Follows
+from .schema import sync_schema, rebuild_search_index
+from .models import (
+    Users,
+    Posts,
+    Reactions,
+    Comments,
+    CommentReply,
+    Follows,
+    FeedItems,
+    ResourceVersions,
+    PostTags,
+    TrendingPosts,
+)
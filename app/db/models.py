@@ -8,14 +8,17 @@ from sqlalchemy import (
     DateTime,
     Enum as SQLAEnum,
     func,
+    text,
     UUID,
     UniqueConstraint,
+    Index,
+    Float,
+    and_,
 )
 from sqlalchemy.orm import relationship
 from .base_class import Base
 import uuid
-import json
-from constants import UserRole, ReactionType
+from constants import UserRole, ReactionType, VersionedResource
 
 
 class Users(Base):
@@ -32,6 +35,12 @@ class Users(Base):
     role = Column(SQLAEnum(UserRole), default=UserRole.USER, nullable=False)
     created_at = Column(DateTime, nullable=False)
     last_seen = Column(DateTime, nullable=True)
+    follower_count = Column(
+        Integer, nullable=False, default=0, server_default=text("0")
+    )
+    following_count = Column(
+        Integer, nullable=False, default=0, server_default=text("0")
+    )
 
     posts = relationship("Posts", back_populates="user", cascade="all, delete-orphan")
     comments = relationship(
@@ -58,12 +67,20 @@ class Posts(Base):
     owner_id = Column(
         Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
-    tagged_user = Column(String)
     created_by = Column(String, nullable=False)
     content = Column(String, nullable=False)
     image_url = Column(String, nullable=True)
     created_at = Column(DateTime, nullable=False)
     updated_date = Column(DateTime, nullable=True)
+    reaction_count = Column(
+        Integer, nullable=False, default=0, server_default=text("0")
+    )
+    comment_count = Column(
+        Integer, nullable=False, default=0, server_default=text("0")
+    )
+    # Bumped by database triggers whenever the post or anything under it
+    # changes; see db/schema.py.
+    version = Column(Integer, nullable=False, default=0, server_default=text("0"))
 
     user = relationship("Users", back_populates="posts")
     comments = relationship(
@@ -78,25 +95,17 @@ class Posts(Base):
         back_populates="post",
         cascade="all, delete-orphan",
     )
+    tags = relationship(
+        "PostTags",
+        back_populates="post",
+        cascade="all, delete-orphan",
+        order_by="PostTags.id",
+    )
 
-    def set_tagged_user(self, users: list):
-        self.tagged_user = json.dumps(users)
-
-    def get_tagged_user(self):
-        if self.tagged_user is None:
-            return []
-        return json.loads(self.tagged_user)
-
-    def is_user_tagged(self, username: str):
-        if not self.tagged_user:
-            return False
-
-        try:
-            tagged_users = json.loads(self.tagged_user)
-        except json.JSONDecodeError:
-            return False
-
-        return username in tagged_users
+    __table_args__ = (
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_owner_id_created_at_id", "owner_id", "created_at", "id"),
+    )
 
 
 class Comments(Base):
@@ -112,6 +121,12 @@ class Comments(Base):
     content = Column(String, nullable=False)
     created_at = Column(DateTime, nullable=False)
     updated_date = Column(DateTime, nullable=True)
+    reaction_count = Column(
+        Integer, nullable=False, default=0, server_default=text("0")
+    )
+    reply_count = Column(
+        Integer, nullable=False, default=0, server_default=text("0")
+    )
 
     user = relationship("Users", back_populates="comments")
     post = relationship("Posts", back_populates="comments")
@@ -125,6 +140,11 @@ class Comments(Base):
         cascade="all, delete-orphan",
     )
 
+    # Also serves comment lookups by post.
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at_id", "post_id", "created_at", "id"),
+    )
+
 
 class CommentReply(Base):
     __tablename__ = "comment_replies"
@@ -139,9 +159,22 @@ class CommentReply(Base):
     comment_id = Column(
         Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=False
     )
+    # Set on replies to another reply. Deleting a reply deletes its subtree.
+    parent_id = Column(
+        Integer, ForeignKey("comment_replies.id", ondelete="CASCADE"), nullable=True
+    )
+    # Zero-padded ids from the top-level reply down to this one, filled in
+    # by a trigger (see db/schema.py). Ordering a comment's replies by path
+    # gives the thread in display order, and a reply's subtree is the range
+    # of paths it prefixes.
+    path = Column(String, nullable=False, default="", server_default=text("''"))
+    depth = Column(Integer, nullable=False, default=0, server_default=text("0"))
     content = Column(String, nullable=False)
     created_at = Column(DateTime, nullable=False)
     updated_date = Column(DateTime, nullable=True)
+    reaction_count = Column(
+        Integer, nullable=False, default=0, server_default=text("0")
+    )
 
     user = relationship("Users", back_populates="reply")
     post = relationship("Posts", back_populates="reply")
@@ -153,6 +186,10 @@ class CommentReply(Base):
         cascade="all, delete-orphan",
     )
 
+    __table_args__ = (
+        Index("ix_comment_replies_comment_id_path", "comment_id", "path"),
+    )
+
 
 class Reactions(Base):
     __tablename__ = "reactions"
@@ -171,6 +208,42 @@ class Reactions(Base):
     comment = relationship("Comments", back_populates="reactions")
     reply = relationship("CommentReply", back_populates="reactions")
 
+    # The loaders read reactions by post, by comment (reply_id IS NULL for
+    # the comment's own) and by reply; the same indexes serve the cascades.
+    # One reaction per user per target. Unique indexes treat NULLs as
+    # distinct, so each target level gets its own partial index.
+    __table_args__ = (
+        Index(
+            "ix_reactions_post_id_comment_id_reply_id",
+            "post_id",
+            "comment_id",
+            "reply_id",
+        ),
+        Index("ix_reactions_comment_id_reply_id", "comment_id", "reply_id"),
+        Index("ix_reactions_reply_id", "reply_id"),
+        Index(
+            "unique_post_reaction",
+            "owner_id",
+            "post_id",
+            unique=True,
+            sqlite_where=and_(comment_id.is_(None), reply_id.is_(None)),
+        ),
+        Index(
+            "unique_comment_reaction",
+            "owner_id",
+            "comment_id",
+            unique=True,
+            sqlite_where=and_(comment_id.isnot(None), reply_id.is_(None)),
+        ),
+        Index(
+            "unique_reply_reaction",
+            "owner_id",
+            "reply_id",
+            unique=True,
+            sqlite_where=reply_id.isnot(None),
+        ),
+    )
+
 
 class Follows(Base):
     __tablename__ = "follows"
@@ -184,4 +257,78 @@ class Follows(Base):
     follower_user = relationship("Users", foreign_keys=[follower_id])
     followed_user = relationship("Users", foreign_keys=[user_id])
 
-    __table_args__ = (UniqueConstraint("user_id", "follower_id", name="unique_follow"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "follower_id", name="unique_follow"),
+        Index("ix_follows_follower_id_user_id", "follower_id", "user_id"),
+    )
+
+
+class FeedItems(Base):
+    __tablename__ = "feed_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    post_id = Column(
+        Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False
+    )
+    author_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "post_id", name="unique_feed_item"),
+        Index(
+            "ix_feed_items_user_id_created_at_post_id",
+            "user_id",
+            "created_at",
+            "post_id",
+        ),
+    )
+
+
+class ResourceVersions(Base):
+    __tablename__ = "resource_versions"
+
+    name = Column(SQLAEnum(VersionedResource), primary_key=True)
+    version = Column(Integer, nullable=False, default=0, server_default=text("0"))
+
+
+class PostTags(Base):
+    __tablename__ = "post_tags"
+
+    id = Column(Integer, primary_key=True, index=True)
+    post_id = Column(
+        Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False
+    )
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    # Copied from the post so a user's tagged posts page straight off the index.
+    created_at = Column(DateTime, nullable=False)
+
+    post = relationship("Posts", back_populates="tags")
+
+    __table_args__ = (
+        UniqueConstraint("post_id", "user_id", name="unique_post_tag"),
+        Index(
+            "ix_post_tags_user_id_created_at_post_id",
+            "user_id",
+            "created_at",
+            "post_id",
+        ),
+    )
+
+
+# Last persisted snapshot of the in-memory trending ranking; see
+# services/trending_service.py.
+class TrendingPosts(Base):
+    __tablename__ = "trending_posts"
+
+    post_id = Column(
+        Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True
+    )
+    score = Column(Float, nullable=False)
+    computed_at = Column(DateTime, nullable=False)
@@ -0,0 +1,433 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from constants import VersionedResource, FEED_MAX_ITEMS, FANOUT_FOLLOWER_LIMIT
+from .base_class import Base
+
+
+def _bump_post_version(table: str, event: str, row: str):
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_bump_post_version
+        AFTER {event} ON {table}
+        BEGIN
+            UPDATE posts SET version = version + 1 WHERE id = {row}.post_id;
+        END
+    """
+
+
+def _bump_resource_version(name: str, resource: VersionedResource, event: str):
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {name}
+        AFTER {event}
+        BEGIN
+            UPDATE resource_versions SET version = version + 1
+            WHERE name = '{resource.name}';
+        END
+    """
+
+
+# FTS5 indexes over the text columns, keyed by the source row id. They are
+# external content tables, so the text itself is only stored once.
+SEARCH_TABLES = {
+    "posts_fts": "posts",
+    "comments_fts": "comments",
+    "comment_replies_fts": "comment_replies",
+}
+
+
+def _create_search_table(search_table: str, table: str):
+    return f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {search_table} USING fts5(
+            content,
+            content='{table}',
+            content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        )
+    """
+
+
+def _sync_search_table(search_table: str, table: str):
+    remove_old = f"""
+        INSERT INTO {search_table} ({search_table}, rowid, content)
+        VALUES ('delete', OLD.id, OLD.content);
+    """
+    add_new = f"""
+        INSERT INTO {search_table} (rowid, content) VALUES (NEW.id, NEW.content);
+    """
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_insert_sync_search
+        AFTER INSERT ON {table}
+        BEGIN {add_new} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_update_sync_search
+        AFTER UPDATE OF content ON {table}
+        BEGIN {remove_old} {add_new} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_delete_sync_search
+        AFTER DELETE ON {table}
+        BEGIN {remove_old} END
+        """,
+    ]
+
+
+# Reaction counters: (counted table, reaction column, condition on the
+# reaction row) for posts, comments and replies.
+REACTION_COUNTERS = [
+    ("posts", "post_id", "{row}.comment_id IS NULL AND {row}.reply_id IS NULL"),
+    ("comments", "comment_id", "{row}.reply_id IS NULL"),
+    ("comment_replies", "reply_id", "{row}.reply_id IS NOT NULL"),
+]
+
+
+def _count_reactions(event: str, row: str, delta: str):
+    """Keep the reaction counter of the reacted-to post, comment or reply."""
+    updates = "".join(
+        f"""
+            UPDATE {counted} SET reaction_count = reaction_count {delta} 1
+            WHERE id = {row}.{column} AND {condition.format(row=row)};"""
+        for counted, column, condition in REACTION_COUNTERS
+    )
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS reactions_{event.lower()}_count
+        AFTER {event} ON reactions
+        BEGIN{updates}
+        END
+    """
+
+
+def _count_rows(table: str, event: str, row: str, delta: str, counters):
+    """Keep counter columns equal to the number of ``table`` rows naming them.
+
+    ``counters`` are (counted table, counter column, ``table`` column) triples.
+    As triggers they also cover rows removed by cascades.
+    """
+    updates = "".join(
+        f"""
+            UPDATE {counted} SET {counter} = {counter} {delta} 1
+            WHERE id = {row}.{column};"""
+        for counted, counter, column in counters
+    )
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_count
+        AFTER {event} ON {table}
+        BEGIN{updates}
+        END
+    """
+
+
+# Counter columns kept by triggers, for each table whose rows they count.
+COUNTERS = {
+    "comments": [("posts", "comment_count", "post_id")],
+    "comment_replies": [("comments", "reply_count", "comment_id")],
+    "follows": [
+        ("users", "follower_count", "user_id"),
+        ("users", "following_count", "follower_id"),
+    ],
+}
+
+# Each trigger-kept counter computed from scratch, to fill in a counter
+# column added to an existing database; the triggers only count later rows.
+COUNTER_BACKFILLS = {
+    (counted, counter): f"SELECT count(*) FROM {table} WHERE {column} = {counted}.id"
+    for table, counters in COUNTERS.items()
+    for counted, counter, column in counters
+}
+COUNTER_BACKFILLS.update(
+    {
+        (counted, "reaction_count"): (
+            f"SELECT count(*) FROM reactions WHERE {column} = {counted}.id "
+            f"AND {condition.format(row='reactions')}"
+        )
+        for counted, column, condition in REACTION_COUNTERS
+    }
+)
+
+
+def _backfill_counter(connection, table: str, counter: str):
+    connection.execute(
+        text(
+            f"UPDATE {table} SET {counter} = ({COUNTER_BACKFILLS[table, counter]})"
+        )
+    )
+
+
+def rebuild_search_index(connection, search_tables=SEARCH_TABLES):
+    """Re-read every row of the source tables into their search indexes."""
+    for search_table in search_tables:
+        connection.execute(
+            text(f"INSERT INTO {search_table} ({search_table}) VALUES ('rebuild')")
+        )
+
+
+TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_update_bump_post_version
+    AFTER UPDATE OF content, image_url ON posts
+    BEGIN
+        UPDATE posts SET version = version + 1 WHERE id = NEW.id;
+    END
+    """,
+    *(
+        _bump_post_version(table, event, row)
+        for table in ("comments", "comment_replies", "reactions")
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+    ),
+    *(
+        _bump_post_version("post_tags", event, row)
+        for event, row in (("INSERT", "NEW"), ("DELETE", "OLD"))
+    ),
+    """
+    CREATE TRIGGER IF NOT EXISTS comment_replies_insert_set_path
+    AFTER INSERT ON comment_replies
+    WHEN NEW.path = ''
+    BEGIN
+        UPDATE comment_replies
+        SET
+            path = coalesce(
+                (SELECT path FROM comment_replies WHERE id = NEW.parent_id), ''
+            ) || printf('%010d/', NEW.id),
+            depth = coalesce(
+                (SELECT depth + 1 FROM comment_replies WHERE id = NEW.parent_id), 0
+            )
+        WHERE id = NEW.id;
+    END
+    """,
+    _count_reactions("INSERT", "NEW", "+"),
+    _count_reactions("DELETE", "OLD", "-"),
+    *(
+        _count_rows(table, event, row, delta, counters)
+        for table, counters in COUNTERS.items()
+        for event, row, delta in (("INSERT", "NEW", "+"), ("DELETE", "OLD", "-"))
+    ),
+    *(
+        _bump_resource_version(
+            f"users_{event.lower()}_bump_version",
+            VersionedResource.USERS,
+            f"{event} ON users",
+        )
+        for event in ("INSERT", "UPDATE", "DELETE")
+    ),
+    _bump_resource_version(
+        "users_username_bump_version",
+        VersionedResource.USERNAMES,
+        "UPDATE OF username ON users",
+    ),
+    _bump_resource_version(
+        "users_delete_bump_usernames_version",
+        VersionedResource.USERNAMES,
+        "DELETE ON users",
+    ),
+    *(
+        _bump_resource_version(
+            f"follows_{event.lower()}_bump_version",
+            VersionedResource.FOLLOWS,
+            f"{event} ON follows",
+        )
+        for event in ("INSERT", "DELETE")
+    ),
+    *(
+        trigger
+        for search_table, table in SEARCH_TABLES.items()
+        for trigger in _sync_search_table(search_table, table)
+    ),
+]
+
+
+def _migrate_tagged_users(engine):
+    """Move tags from the old JSON ``posts.tagged_user`` column into post_tags.
+
+    Usernames that no longer exist are dropped. The column is removed
+    afterwards, along with the trigger that referenced it.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("posts")}
+    if "tagged_user" not in columns:
+        return
+
+    with engine.begin() as connection:
+        connection.execute(
+            text("DROP TRIGGER IF EXISTS posts_update_bump_post_version")
+        )
+        connection.execute(
+            text(
+                """
+                INSERT OR IGNORE INTO post_tags (post_id, user_id, created_at)
+                SELECT posts.id, users.id, posts.created_at
+                FROM posts
+                JOIN json_each(
+                    CASE WHEN json_valid(posts.tagged_user)
+                    THEN posts.tagged_user ELSE '[]' END
+                ) AS tag
+                JOIN users ON users.username = tag.value
+                ORDER BY posts.id, tag.key
+                """
+            )
+        )
+        connection.execute(text("ALTER TABLE posts DROP COLUMN tagged_user"))
+
+
+def _migrate_reply_paths(engine):
+    """Give replies written before threading the path of a top-level reply.
+
+    The (comment_id, created_at, id) index it replaces is dropped.
+    """
+    with engine.begin() as connection:
+        connection.execute(
+            text("DROP INDEX IF EXISTS ix_comment_replies_comment_id_created_at_id")
+        )
+        connection.execute(
+            text(
+                "UPDATE comment_replies SET path = printf('%010d/', id), depth = 0 "
+                "WHERE path = ''"
+            )
+        )
+
+
+def _dedupe_reactions(engine):
+    """Drop repeated reactions by one user on one target, keeping the first.
+
+    They could be created before the unique reaction indexes existed, and
+    would stop those indexes from being built. The reaction counters are
+    recomputed afterwards, as the delete trigger may not exist yet.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("posts")}
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                DELETE FROM reactions WHERE id NOT IN (
+                    SELECT min(id) FROM reactions
+                    GROUP BY
+                        owner_id,
+                        CASE
+                            WHEN reply_id IS NOT NULL THEN 'reply'
+                            WHEN comment_id IS NOT NULL THEN 'comment'
+                            ELSE 'post'
+                        END,
+                        coalesce(reply_id, comment_id, post_id)
+                )
+                """
+            )
+        )
+        # Databases older than the counters get them from the column backfill.
+        if "reaction_count" in columns:
+            for counted, _, _ in REACTION_COUNTERS:
+                _backfill_counter(connection, counted, "reaction_count")
+
+
+def _backfill_feed_items(engine):
+    """Fill empty feeds from the follows made before feeds were materialized.
+
+    Each user gets the newest posts of the authors they follow that are fanned
+    out, as fan-out on write would have given them. Runs while feed_items is
+    empty and follows is not.
+    """
+    with engine.begin() as connection:
+        if connection.execute(
+            text(
+                "SELECT NOT EXISTS (SELECT 1 FROM feed_items) "
+                "AND EXISTS (SELECT 1 FROM follows)"
+            )
+        ).scalar():
+            connection.execute(
+                text(
+                    """
+                    INSERT OR IGNORE INTO feed_items
+                        (user_id, post_id, author_id, created_at)
+                    SELECT user_id, post_id, author_id, created_at FROM (
+                        SELECT
+                            follows.follower_id AS user_id,
+                            posts.id AS post_id,
+                            posts.owner_id AS author_id,
+                            posts.created_at AS created_at,
+                            row_number() OVER (
+                                PARTITION BY follows.follower_id
+                                ORDER BY posts.created_at DESC, posts.id DESC
+                            ) AS position
+                        FROM follows
+                        JOIN users ON users.id = follows.user_id
+                        JOIN posts ON posts.owner_id = follows.user_id
+                        WHERE users.follower_count <= :fanout_follower_limit
+                    )
+                    WHERE position <= :feed_max_items
+                    """
+                ),
+                {
+                    "fanout_follower_limit": FANOUT_FOLLOWER_LIMIT,
+                    "feed_max_items": FEED_MAX_ITEMS,
+                },
+            )
+
+
+def sync_schema(engine):
+    """Bring an existing database up to date with the models.
+
+    ``create_all`` skips tables that already exist, so columns and indexes
+    added to a model later would never reach a database created before
+    them. Added columns need a server default when they are not nullable;
+    added counter columns are filled in within the same transaction.
+    Data migrations, triggers, search indexes and the resource version rows
+    are handled here as well.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    if "reactions" in existing_tables and "unique_post_reaction" not in {
+        index["name"] for index in inspector.get_indexes("reactions")
+    }:
+        _dedupe_reactions(engine)
+
+    migrate_reply_paths = "comment_replies" in existing_tables and "path" not in {
+        column["name"] for column in inspector.get_columns("comment_replies")
+    }
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_columns = {
+            column["name"] for column in inspector.get_columns(table.name)
+        }
+        with engine.begin() as connection:
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                connection.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}")
+                )
+                if (table.name, column.name) in COUNTER_BACKFILLS:
+                    _backfill_counter(connection, table.name, column.name)
+
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    if "posts" in existing_tables:
+        _migrate_tagged_users(engine)
+    if migrate_reply_paths:
+        _migrate_reply_paths(engine)
+    if "follows" in existing_tables:
+        _backfill_feed_items(engine)
+
+    new_search_tables = [
+        search_table
+        for search_table in SEARCH_TABLES
+        if search_table not in existing_tables
+    ]
+
+    with engine.begin() as connection:
+        for search_table, table in SEARCH_TABLES.items():
+            connection.execute(text(_create_search_table(search_table, table)))
+        for resource in VersionedResource:
+            connection.execute(
+                text(
+                    "INSERT OR IGNORE INTO resource_versions (name, version) "
+                    "VALUES (:name, 0)"
+                ),
+                {"name": resource.name},
+            )
+        for trigger in TRIGGERS:
+            connection.execute(text(trigger))
+        # Rows written before the index existed are not in it yet.
+        rebuild_search_index(connection, new_search_tables)
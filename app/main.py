@@ -1,16 +1,37 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from db import engine, Base, models
+from db import engine, Base, models, sync_schema
 from routers import router
+from starlette.concurrency import run_in_threadpool
+from services import (
+    run_trending_persistence,
+    persist_trending,
+    flush_reactions,
+    load_follow_graph,
+)
 import uvicorn
 from pathlib import Path
 
-app = FastAPI(title="Social Media App")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(load_follow_graph)
+    trending_task = asyncio.create_task(run_trending_persistence())
+    yield
+    await flush_reactions()
+    trending_task.cancel()
+    persist_trending()
+
+
+app = FastAPI(title="Social Media App", lifespan=lifespan)
 
 static_dir = Path(__file__).resolve().parent / "static"
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 models.Base.metadata.create_all(bind=engine)
+sync_schema(engine)
 
 app.include_router(router)
 
@@ -0,0 +1,79 @@
+import argparse
+import csv
+from db import SessionLocal, engine, rebuild_search_index
+from services import reconcile_counters, import_follows
+
+
+def run_reconcile_counters(args):
+    db = SessionLocal()
+    try:
+        reconcile_counters(db)
+    finally:
+        db.close()
+    print("Counters reconciled")
+
+
+def run_rebuild_search_index(args):
+    with engine.begin() as connection:
+        rebuild_search_index(connection)
+    print("Search index rebuilt")
+
+
+def _follow_edges(csv_file):
+    """(follower_id, user_id) pairs from CSV rows, after an optional header."""
+    for line, row in enumerate(csv.reader(csv_file), start=1):
+        if not row:
+            continue
+        try:
+            follower_id, user_id = (int(value) for value in row)
+        except ValueError:
+            if line == 1:
+                continue
+            raise SystemExit(f"Invalid follow row on line {line}: {row}")
+        yield follower_id, user_id
+
+
+def run_import_follows(args):
+    db = SessionLocal()
+    try:
+        with open(args.csv_path, newline="") as csv_file:
+            imported, existing, self_follows, unknown = import_follows(
+                db, _follow_edges(csv_file)
+            )
+    finally:
+        db.close()
+    print(
+        f"Imported {imported} follows, {existing} already existed, "
+        f"{self_follows} were self-follows, {unknown} named unknown users"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Social Media App maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reconcile = commands.add_parser(
+        "reconcile_counters",
+        help="Recompute reaction, comment, reply and follow counters from their tables",
+    )
+    reconcile.set_defaults(handler=run_reconcile_counters)
+
+    rebuild = commands.add_parser(
+        "rebuild_search_index",
+        help="Re-index the text of every post, comment and reply for search",
+    )
+    rebuild.set_defaults(handler=run_rebuild_search_index)
+
+    follows = commands.add_parser(
+        "import_follows",
+        help="Import follows from a CSV of follower_id,user_id rows",
+    )
+    follows.add_argument("csv_path")
+    follows.set_defaults(handler=run_import_follows)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
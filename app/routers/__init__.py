@@ -7,6 +7,7 @@ from .comments import router as comment_router
 from .reactions import router as reaction_router
 from .follow import router as follow_router
 from .reply import router as reply_router
+from .search import router as search_router
 
 
 router = APIRouter()
@@ -19,3 +20,4 @@ router.include_router(posts_router, prefix="/posts", tags=["Posts"])
 router.include_router(comment_router, prefix="/posts", tags=["Comments"])
 router.include_router(reply_router, prefix="/posts", tags=["Comment Replies"])
 router.include_router(reaction_router, prefix="/posts", tags=["Reactions"])
+router.include_router(search_router, prefix="/search", tags=["Search"])
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, HTTPException, Path, Query
+from fastapi import APIRouter, HTTPException, Path, Query, Header
 from starlette import status
-from db import db_dependency, Users, Posts, Comments, CommentReply
+from db import db_dependency, Users, Comments, CommentReply
 from .users import user_dependency
 from schemes import UserResponse
 from typing import Optional, List
@@ -8,6 +8,16 @@ from uuid import UUID
 from sqlalchemy.orm import joinedload
 import os
 from utils import load_environment, is_user_admin, get_user, get_post_or_404
+from services import (
+    wants_ndjson,
+    ndjson_response,
+    invalidate_post,
+    forget_trending_post,
+    invalidate_all_posts,
+    forget_usernames,
+    access_token_cache_stats,
+    password_hashing_stats,
+)
 
 router = APIRouter()
 
@@ -15,17 +25,7 @@ load_environment()
 BASE_URL = os.getenv("BASE_URL")
 
 
-@router.get("/", status_code=status.HTTP_200_OK, response_model=List[UserResponse])
-async def get_users_details(user: user_dependency, db: db_dependency):
-    is_user_admin(user)
-
-    query_users = db.query(Users).all()
-
-    if not query_users:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="No users found"
-        )
-
+def _user_details(users):
     return [
         UserResponse(
             id=user.id,
@@ -39,10 +39,32 @@ async def get_users_details(user: user_dependency, db: db_dependency):
             created_at=user.created_at,
             last_login=user.last_seen,
         )
-        for user in query_users
+        for user in users
     ]
 
 
+@router.get("/", status_code=status.HTTP_200_OK, response_model=List[UserResponse])
+async def get_users_details(
+    user: user_dependency, db: db_dependency, accept: Optional[str] = Header(None)
+):
+    is_user_admin(user)
+
+    if wants_ndjson(accept):
+        return ndjson_response(
+            db.query(Users).order_by(Users.id),
+            lambda session, users: _user_details(users),
+        )
+
+    query_users = db.query(Users).all()
+
+    if not query_users:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No users found"
+        )
+
+    return _user_details(query_users)
+
+
 @router.get(
     "/get_user_by_id/", status_code=status.HTTP_200_OK, response_model=UserResponse
 )
@@ -105,8 +127,11 @@ async def delete_user(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
+    username = query_user.username
     db.delete(query_user)
     db.commit()
+    forget_usernames(username)
+    invalidate_all_posts()
     return {"detail": "User deleted successfully"}
 
 
@@ -120,6 +145,8 @@ async def delete_post(
 
     db.delete(query_post)
     db.commit()
+    invalidate_post(post_id)
+    forget_trending_post(post_id)
 
     return {"detail": "Post deleted successfully"}
 
@@ -146,6 +173,7 @@ async def delete_comment(
 
     db.delete(query_comment)
     db.commit()
+    invalidate_post(post_id)
 
     return {"detail": "Comment deleted successfully"}
 
@@ -180,5 +208,16 @@ async def delete_reply(
 
     db.delete(query_reply)
     db.commit()
+    invalidate_post(post_id)
 
     return {"detail": "Reply deleted successfully"}
+
+
+@router.get("/auth_stats", status_code=status.HTTP_200_OK)
+async def get_auth_stats(user: user_dependency):
+    is_user_admin(user)
+
+    return {
+        "token_cache": access_token_cache_stats(),
+        "password_hashing": password_hashing_stats(),
+    }
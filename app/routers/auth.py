@@ -11,13 +11,25 @@ from pathlib import Path
 from starlette import status
 from db.database import db_dependency
 from db.models import Users
-from passlib.context import CryptContext
 from typing import Annotated, Union
 from jose import jwt, JWTError
 from schemes import TokenResponse, UserCreate, ResetPassword
 from enum import Enum
 import os
-from services import send_reset_email, create_reset_token, verify_reset_token
+from services import (
+    ACCESS_TOKEN_LIFETIME_SECONDS,
+    send_reset_email,
+    create_reset_token,
+    verify_reset_token,
+    get_user_by_username,
+    wait_for_reactions,
+    cached_access_token,
+    cache_access_token,
+    revoke_access_token,
+    revoke_user_tokens,
+    hash_password,
+    verify_password,
+)
 from utils import load_environment
 
 
@@ -27,16 +39,21 @@ router = APIRouter()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_bearer = OAuth2PasswordBearer(
+    tokenUrl="/auth/login", auto_error=False
+)
 api_key_scheme = APIKeyHeader(name="Authorization")
 
 
-def authenticate_user(username: str, password: str, db):
-    user = db.query(Users).filter(Users.username == username).first()
+async def authenticate_user(username: str, password: str, db):
+    user = get_user_by_username(db, username)
     if not user:
         return False
-    if not bcrypt_context.verify(password, user.password):
+    hashed_password = user.password
+    # Hand the connection back to the pool while bcrypt runs.
+    db.rollback()
+    if not await verify_password(password, hashed_password):
         return False
     return user
 
@@ -44,26 +61,22 @@ def authenticate_user(username: str, password: str, db):
 def create_access_token(
     username: str, user_id: int, role: Enum, expires_delta: timedelta
 ):
-    encode = {"sub": username, "id": user_id, "role": role}
-    expires = datetime.now(timezone.utc) + expires_delta
+    issued_at = datetime.now(timezone.utc)
+    encode = {"sub": username, "id": user_id, "role": role, "iat": issued_at}
+    expires = issued_at + expires_delta
     encode.update({"exp": expires})
 
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(
-    token: Annotated[str, Depends(oauth2_bearer)],
-    token_from_header: Union[str, None] = Security(api_key_scheme),
-):
-    final_token = token or token_from_header
-
-    if not final_token:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="No token provided"
-        )
+def decode_access_token(token: str):
+    """Verify a token, or find it in the cache of tokens verified before."""
+    cached_user = cached_access_token(token)
+    if cached_user is not None:
+        return cached_user
 
     try:
-        payload = jwt.decode(final_token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         user_id: int = payload.get("id")
         user_role: Enum = payload.get("role")
@@ -72,17 +85,53 @@ async def get_current_user(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not valdate user credentials",
             )
-        return {"username": username, "id": user_id, "user_role": user_role}
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not valdate user credentials",
         )
 
+    user = {"username": username, "id": user_id, "user_role": user_role}
+    # Tokens issued before "iat" was added count as issued at the epoch.
+    if not cache_access_token(token, user, payload["exp"], payload.get("iat", 0)):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked"
+        )
+    return user
+
+
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_bearer)],
+    token_from_header: Union[str, None] = Security(api_key_scheme),
+):
+    final_token = token or token_from_header
+
+    if not final_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="No token provided"
+        )
+
+    return decode_access_token(final_token)
+
+
+async def get_optional_user(
+    token: Annotated[Union[str, None], Depends(optional_oauth2_bearer)],
+):
+    """The current user if a token was sent, for routes that also serve guests.
+
+    Waits for the user's buffered reactions so they see their own writes.
+    """
+    if not token:
+        return None
+
+    user = decode_access_token(token)
+    await wait_for_reactions(user["id"])
+    return user
+
 
 @router.post("/register", status_code=status.HTTP_201_CREATED)
 async def create_user(create_user_request: UserCreate, db: db_dependency):
-    hashed_password = bcrypt_context.hash(create_user_request.password)
+    hashed_password = await hash_password(create_user_request.password)
 
     FILEPATH = Path(__file__).resolve().parent.parent / "static"
     default_avatar = "avatar.png"
@@ -143,14 +192,16 @@ async def reset_password(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Failed Authentication"
         )
 
-    validate_user = db.query(Users).filter(Users.email == validate_user).first()
+    # Hashed before the user is loaded, so no connection is held meanwhile.
+    hashed_password = await hash_password(reset_password_request.new_password)
 
-    hashed_password = bcrypt_context.hash(reset_password_request.new_password)
+    validate_user = db.query(Users).filter(Users.email == validate_user).first()
 
     validate_user.password = hashed_password
 
     db.add(validate_user)
     db.commit()
+    revoke_user_tokens(validate_user.id)
     return {"detail": "Password reset successful"}
 
 
@@ -159,7 +210,9 @@ async def login_for_access_token(
     db: db_dependency, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ):
 
-    validate_user = authenticate_user(form_data.username, form_data.password, db)
+    validate_user = await authenticate_user(
+        form_data.username, form_data.password, db
+    )
 
     if not validate_user:
         raise HTTPException(
@@ -173,14 +226,18 @@ async def login_for_access_token(
         validate_user.username,
         validate_user.id,
         validate_user.role,
-        timedelta(minutes=20),
+        timedelta(seconds=ACCESS_TOKEN_LIFETIME_SECONDS),
     )
 
     return TokenResponse(access_token=token, token_type="bearer")
 
 
 @router.post("/logout", status_code=status.HTTP_200_OK)
-async def logout(user: Annotated[dict, Depends(get_current_user)], db: db_dependency):
+async def logout(
+    user: Annotated[dict, Depends(get_current_user)],
+    token: Annotated[str, Depends(oauth2_bearer)],
+    db: db_dependency,
+):
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed"
@@ -191,4 +248,5 @@ async def logout(user: Annotated[dict, Depends(get_current_user)], db: db_depend
     get_current_user.is_active = False
     get_current_user.last_seen = datetime.now(pytz.utc)
     db.commit()
+    revoke_access_token(token, jwt.get_unverified_claims(token)["exp"])
     return {"detail": "Logged out"}
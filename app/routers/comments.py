@@ -1,21 +1,75 @@
-from fastapi import APIRouter, HTTPException, Path
+from fastapi import APIRouter, HTTPException, Path, Query
 from starlette import status
 from datetime import datetime
 import pytz
 from db import db_dependency, Comments, Posts
-from .users import user_dependency
+from typing import Optional
+from .users import user_dependency, optional_user_dependency
 from schemes import (
+    CommentPage,
     CommentCreate,
     CommentResponse,
     CommentUpdateResponse,
     CommentUpdate,
 )
 from sqlalchemy.orm import joinedload
-from utils import is_user_authenticated, get_comment_or_404, get_post_or_404
+from services import (
+    invalidate_post,
+    record_comment,
+    load_comment_responses,
+    parse_expand,
+    EXPAND_DESCRIPTION,
+)
+from utils import (
+    is_user_authenticated,
+    get_comment_or_404,
+    get_post_or_404,
+    paginate,
+)
 
 router = APIRouter()
 
 
+@router.get(
+    "/{post_id}/comments",
+    status_code=status.HTTP_200_OK,
+    response_model=CommentPage,
+    response_model_exclude_unset=True,
+)
+async def get_post_comments(
+    db: db_dependency,
+    viewer: optional_user_dependency,
+    post_id: int = Path(gt=0),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    replies: int = Query(3, ge=0, le=50, description="Replies previewed per comment"),
+    expand: str = Query("all", description=EXPAND_DESCRIPTION),
+):
+    get_post_or_404(db=db, post_id=post_id)
+    expansion = parse_expand(expand, viewer_id=viewer.get("id") if viewer else None)
+
+    query_comments, next_cursor = paginate(
+        db.query(Comments).filter(Comments.post_id == post_id),
+        Comments.created_at,
+        Comments.id,
+        limit=limit,
+        cursor=cursor,
+        oldest_first=True,
+    )
+
+    if not query_comments:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No comments found"
+        )
+
+    return CommentPage(
+        comments=load_comment_responses(
+            db, query_comments, expansion, reply_limit=replies
+        ),
+        next_cursor=next_cursor,
+    )
+
+
 @router.post(
     "/{post_id}/comment",
     status_code=status.HTTP_201_CREATED,
@@ -39,6 +93,8 @@ async def create_comment(
 
     db.add(comment_model)
     db.commit()
+    invalidate_post(post_id)
+    record_comment(post_id)
 
     return CommentResponse(
         detail="Comment added successully",
@@ -77,6 +133,7 @@ async def update_comment(
 
     db.add(query_comment)
     db.commit()
+    invalidate_post(query_comment.post_id)
 
     return CommentUpdateResponse(
         detail="Comment updated successfully",
@@ -118,4 +175,5 @@ async def delete_comment(
 
     db.delete(query_comment)
     db.commit()
+    invalidate_post(post_id)
     return {"detail": "Comment deleted succcessfully"}
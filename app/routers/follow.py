@@ -1,35 +1,56 @@
-from fastapi import APIRouter, HTTPException, Path
+from fastapi import APIRouter, HTTPException, Path, Query
 from starlette import status
 from db import db_dependency, Users, Follows
 from .users import user_dependency
-from schemes import FollowUser, GetFollower
+from schemes import (
+    FollowUser,
+    GetFollower,
+    UserSuggestion,
+    FollowBatch,
+    FollowBatchResponse,
+)
+from utils import is_user_authenticated, fetch_in
 from typing import List
+from services import (
+    backfill_feed,
+    remove_author_from_feed,
+    get_follow_graph,
+    record_follow,
+    record_unfollow,
+    get_suggestions,
+    invalidate_suggestions,
+    existing_user_ids,
+    follow_many,
+    unfollow_many,
+)
 
 router = APIRouter()
 
 
+def _follow_list(db, user_ids):
+    usernames = dict(fetch_in(db.query(Users.id, Users.username), Users.id, user_ids))
+
+    return [
+        GetFollower(user_id=user_id, username=usernames[user_id])
+        for user_id in user_ids
+        if user_id in usernames
+    ]
+
+
 @router.get(
-    "{user_id}/followers",
+    "/{user_id}/followers",
     status_code=status.HTTP_200_OK,
     response_model=List[GetFollower],
 )
 async def get_followers(db: db_dependency, user_id: int = Path(gt=0)):
-    get_followers = (
-        db.query(Users)
-        .join(Follows, Follows.follower_id == Users.id)
-        .filter(Follows.user_id == user_id)
-        .all()
-    )
+    get_followers = _follow_list(db, get_follow_graph(db).followers(user_id))
 
     if not get_followers:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="No followers found"
         )
 
-    return [
-        GetFollower(user_id=follower.id, username=follower.username)
-        for follower in get_followers
-    ]
+    return get_followers
 
 
 @router.get(
@@ -38,12 +59,7 @@ async def get_followers(db: db_dependency, user_id: int = Path(gt=0)):
     response_model=List[GetFollower],
 )
 async def get_following(db: db_dependency, user_id: int = Path(gt=0)):
-    get_following = (
-        db.query(Users)
-        .join(Follows, Follows.user_id == Users.id)
-        .filter(Follows.follower_id == user_id)
-        .all()
-    )
+    get_following = _follow_list(db, get_follow_graph(db).following(user_id))
 
     if not get_following:
         raise HTTPException(
@@ -51,10 +67,32 @@ async def get_following(db: db_dependency, user_id: int = Path(gt=0)):
             detail="Not following any users yet",
         )
 
-    return [
-        GetFollower(user_id=following.id, username=following.username)
-        for following in get_following
-    ]
+    return get_following
+
+
+@router.get(
+    "/{user_id}/suggestions",
+    status_code=status.HTTP_200_OK,
+    response_model=List[UserSuggestion],
+)
+async def get_user_suggestions(
+    db: db_dependency,
+    user_id: int = Path(gt=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    if not db.query(Users.id).filter(Users.id == user_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+        )
+
+    suggestions = get_suggestions(db, user_id, limit)
+
+    if not suggestions:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No suggestions found"
+        )
+
+    return suggestions
 
 
 @router.post(
@@ -75,13 +113,7 @@ async def follow_user(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    existing_follow = (
-        db.query(Follows)
-        .filter(Follows.follower_id == user.get("id"), Follows.user_id == user_id)
-        .first()
-    )
-
-    if existing_follow:
+    if get_follow_graph(db).follows(user.get("id"), user_id):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="User is already followed"
         )
@@ -91,7 +123,10 @@ async def follow_user(
     )
 
     db.add(follow_model)
+    backfill_feed(db, follower_id=user.get("id"), author_id=user_id)
     db.commit()
+    record_follow(db, follower_id=user.get("id"), user_id=user_id)
+    invalidate_suggestions(user.get("id"))
 
     return FollowUser(detail=f"You are now following {query_user.username}")
 
@@ -110,13 +145,7 @@ async def unfollow(user: user_dependency, db: db_dependency, user_id: int = Path
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    existing_follow = (
-        db.query(Follows)
-        .filter(Follows.follower_id == user.get("id"), Follows.user_id == user_id)
-        .first()
-    )
-
-    if not existing_follow:
+    if not get_follow_graph(db).follows(user.get("id"), user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="You are not following this user",
@@ -125,6 +154,53 @@ async def unfollow(user: user_dependency, db: db_dependency, user_id: int = Path
     db.query(Follows).filter(
         Follows.follower_id == user.get("id"), Follows.user_id == user_id
     ).delete()
+    remove_author_from_feed(db, follower_id=user.get("id"), author_id=user_id)
     db.commit()
+    record_unfollow(db, follower_id=user.get("id"), user_id=user_id)
+    invalidate_suggestions(user.get("id"))
 
     return {"detail": f"You have unfollowed {query_user.username}"}
+
+
+def _follow_batch(db, user, batch_request, change):
+    check_auth = is_user_authenticated(user)
+    user_ids = list(dict.fromkeys(batch_request.user_ids))
+    found = existing_user_ids(db, user_ids)
+
+    changed = change(
+        db,
+        [(check_auth.get("id"), user_id) for user_id in user_ids if user_id in found],
+    )
+    changed_ids = {user_id for _, user_id in changed}
+
+    return FollowBatchResponse(
+        applied=[user_id for user_id in user_ids if user_id in changed_ids],
+        skipped=[
+            user_id
+            for user_id in user_ids
+            if user_id in found and user_id not in changed_ids
+        ],
+        not_found=[user_id for user_id in user_ids if user_id not in found],
+    )
+
+
+@router.post(
+    "/follow:batch",
+    status_code=status.HTTP_200_OK,
+    response_model=FollowBatchResponse,
+)
+async def follow_users(
+    user: user_dependency, db: db_dependency, batch_request: FollowBatch
+):
+    return _follow_batch(db, user, batch_request, follow_many)
+
+
+@router.post(
+    "/unfollow:batch",
+    status_code=status.HTTP_200_OK,
+    response_model=FollowBatchResponse,
+)
+async def unfollow_users(
+    user: user_dependency, db: db_dependency, batch_request: FollowBatch
+):
+    return _follow_batch(db, user, batch_request, unfollow_many)
@@ -1,27 +1,65 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Path
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    UploadFile,
+    File,
+    Path,
+    Query,
+    BackgroundTasks,
+    Header,
+    Response,
+)
 from starlette import status
 from pathlib import Path
-from db import db_dependency, Posts, Comments, Users, CommentReply, Reactions
-from .users import user_dependency
+from db import db_dependency, Posts, PostTags
+from constants import VersionedResource
+from .users import user_dependency, optional_user_dependency
 from schemes import (
     PostCreate,
     CreatePostResponse,
     PostResponse,
+    PostPage,
     PostUpdate,
-    ReactionListResponse,
-    GetComments,
-    GetReactions,
     UserTag,
-    GetReplies,
 )
-from services import upload_image, update_image, remove_image
-import json
+from services import (
+    upload_image,
+    update_image,
+    remove_image,
+    load_post_responses,
+    parse_expand,
+    EXPAND_DESCRIPTION,
+    fan_out_post,
+    get_home_feed,
+    resolve_usernames,
+    wants_ndjson,
+    ndjson_response,
+    ALL_POSTS_HEAD_TAG,
+    post_tag,
+    timeline_head_tag,
+    cached_json_response,
+    cache_json_response,
+    invalidate_post,
+    forget_trending_post,
+    get_trending_post_ids,
+    invalidate_new_post,
+    get_versions,
+    make_etag,
+    etag_matches,
+    not_modified_response,
+    wait_for_reactions,
+)
 from datetime import datetime
 import pytz
-from typing import List
-from sqlalchemy.orm import joinedload
+from typing import Optional
 import os
-from utils import load_environment, is_user_authenticated, get_post_or_404
+from utils import (
+    load_environment,
+    is_user_authenticated,
+    get_post_or_404,
+    keyset_order,
+    paginate,
+)
 
 router = APIRouter()
 
@@ -29,21 +67,65 @@ load_environment()
 BASE_URL = os.getenv("BASE_URL")
 
 
-@router.get("", status_code=status.HTTP_200_OK, response_model=List[PostResponse])
-async def get_all_posts(db: db_dependency):
-    query_posts = db.query(Posts).options(
-        joinedload(Posts.comments).joinedload(Comments.user),
-        joinedload(Posts.comments)
-        .joinedload(Comments.reactions)
-        .joinedload(Reactions.user),
-        joinedload(Posts.comments)
-        .joinedload(Comments.replies)
-        .joinedload(CommentReply.user),
-        joinedload(Posts.comments)
-        .joinedload(Comments.replies)
-        .joinedload(CommentReply.reactions)
-        .joinedload(Reactions.user),
-        joinedload(Posts.reactions).joinedload(Reactions.user),
+def _page_tags(posts, head_tag: str, cursor: Optional[str]):
+    tags = {post_tag(post.id) for post in posts}
+    # Only the first page can gain a newly created post.
+    if cursor is None:
+        tags.add(head_tag)
+    return tags
+
+
+def _page_etag(db, versions_query, cache_key, limit: int, cursor: Optional[str]):
+    """Version token for a page, read without loading the post trees."""
+    page_versions, _ = paginate(
+        versions_query, Posts.created_at, Posts.id, limit=limit, cursor=cursor
+    )
+    return make_etag(
+        cache_key, page_versions, get_versions(db, VersionedResource.USERNAMES)
+    )
+
+
+@router.get(
+    "",
+    status_code=status.HTTP_200_OK,
+    response_model=PostPage,
+    response_model_exclude_unset=True,
+)
+async def get_all_posts(
+    db: db_dependency,
+    viewer: optional_user_dependency,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    expand: str = Query("all", description=EXPAND_DESCRIPTION),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    expansion = parse_expand(expand, viewer_id=viewer.get("id") if viewer else None)
+    posts_query = db.query(Posts)
+
+    if wants_ndjson(accept):
+        return ndjson_response(
+            keyset_order(posts_query, Posts.created_at, Posts.id, cursor),
+            lambda session, rows: load_post_responses(session, rows, expansion),
+        )
+
+    cache_key = ("posts", limit, cursor, expansion)
+    etag = _page_etag(
+        db,
+        db.query(Posts.id, Posts.created_at, Posts.version),
+        cache_key,
+        limit=limit,
+        cursor=cursor,
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+
+    cached = cached_json_response(cache_key, etag)
+    if cached is not None:
+        return cached
+
+    query_posts, next_cursor = paginate(
+        posts_query, Posts.created_at, Posts.id, limit=limit, cursor=cursor
     )
 
     if not query_posts:
@@ -51,139 +133,178 @@ async def get_all_posts(db: db_dependency):
             status_code=status.HTTP_404_NOT_FOUND, detail="Posts not found"
         )
 
-    return [
-        PostResponse(
-            id=post.id,
-            created_by=post.created_by,
-            tagged_users=post.get_tagged_user(),
-            post_content=post.content,
-            image_url=f"{BASE_URL}/static/{post.image_url or 'avatar.png'}",
-            created_at=post.created_at,
-            reaction_count=len(post.reactions),
-            reactions=[
-                ReactionListResponse(
-                    id=reaction.id,
-                    owner=reaction.user.username,
-                    reaction_type=reaction.reaction_type,
-                    reaction_count=len(post.reactions),
-                )
-                for reaction in post.reactions
-            ],
-            comment_count=len(post.comments),
-            comments=[
-                GetComments(
-                    id=comment.id,
-                    created_by=comment.user.username,
-                    comment_content=comment.content,
-                    created_at=comment.created_at,
-                    reaction_count=len(comment.reactions),
-                    reactions=[
-                        GetReactions(
-                            id=comment_reaction.id,
-                            owner=comment_reaction.user.username,
-                            reaction_type=comment_reaction.reaction_type,
-                        )
-                        for comment_reaction in comment.reactions
-                    ],
-                    reply_count=len(comment.replies),
-                    reply=[
-                        GetReplies(
-                            id=reply.id,
-                            created_by=reply.user.username,
-                            reply_content=reply.content,
-                            created_at=reply.created_at,
-                            reaction_count=len(reply.reactions),
-                            reactions=[
-                                GetReactions(
-                                    id=reply_reactions.id,
-                                    owner=reply_reactions.user.username,
-                                    reaction_type=reply_reactions.reaction_type,
-                                )
-                                for reply_reactions in reply.reactions
-                            ],
-                        )
-                        for reply in comment.replies
-                    ],
-                )
-                for comment in post.comments
-            ],
+    posts = load_post_responses(db, query_posts, expansion)
+
+    return cache_json_response(
+        cache_key,
+        PostPage(posts=posts, next_cursor=next_cursor),
+        _page_tags(posts, ALL_POSTS_HEAD_TAG, cursor),
+        etag,
+    )
+
+
+@router.get(
+    "/feed",
+    status_code=status.HTTP_200_OK,
+    response_model=PostPage,
+    response_model_exclude_unset=True,
+)
+async def get_feed(
+    response: Response,
+    user: user_dependency,
+    db: db_dependency,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    expand: str = Query("all", description=EXPAND_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
+    check_auth = is_user_authenticated(user)
+    await wait_for_reactions(check_auth.get("id"))
+    expansion = parse_expand(expand, viewer_id=check_auth.get("id"))
+
+    query_posts, next_cursor = get_home_feed(
+        db, user_id=check_auth.get("id"), limit=limit, cursor=cursor
+    )
+
+    if not query_posts:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No posts in feed"
         )
-        for post in query_posts
+
+    etag = make_etag(
+        ("feed", check_auth.get("id"), limit, cursor, expansion),
+        [(post.id, post.version) for post in query_posts],
+        get_versions(db, VersionedResource.USERNAMES),
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+    response.headers["ETag"] = etag
+
+    posts = load_post_responses(db, query_posts, expansion)
+
+    return PostPage(posts=posts, next_cursor=next_cursor)
+
+
+@router.get(
+    "/trending",
+    status_code=status.HTTP_200_OK,
+    response_model=PostPage,
+    response_model_exclude_unset=True,
+)
+async def get_trending_posts(
+    db: db_dependency,
+    viewer: optional_user_dependency,
+    limit: int = Query(20, ge=1, le=100),
+    expand: str = Query("all", description=EXPAND_DESCRIPTION),
+):
+    expansion = parse_expand(expand, viewer_id=viewer.get("id") if viewer else None)
+
+    post_ids = get_trending_post_ids(limit)
+    posts_by_id = {
+        post.id: post for post in db.query(Posts).filter(Posts.id.in_(post_ids))
+    }
+    query_posts = [
+        posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id
     ]
 
+    if not query_posts:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Posts not found"
+        )
+
+    posts = load_post_responses(db, query_posts, expansion)
+
+    return PostPage(posts=posts)
+
 
 @router.get(
     "/user/{user_id}",
     status_code=status.HTTP_200_OK,
-    response_model=List[PostResponse],
+    response_model=PostPage,
+    response_model_exclude_unset=True,
 )
-async def get_user_timeline(db: db_dependency, user_id: int = Path(gt=0)):
-    query_posts = db.query(Posts).filter(Posts.owner_id == user_id).all()
+async def get_user_timeline(
+    db: db_dependency,
+    viewer: optional_user_dependency,
+    user_id: int = Path(gt=0),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    expand: str = Query("all", description=EXPAND_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
+    expansion = parse_expand(expand, viewer_id=viewer.get("id") if viewer else None)
+
+    cache_key = ("timeline", user_id, limit, cursor, expansion)
+    etag = _page_etag(
+        db,
+        db.query(Posts.id, Posts.created_at, Posts.version).filter(
+            Posts.owner_id == user_id
+        ),
+        cache_key,
+        limit=limit,
+        cursor=cursor,
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+
+    cached = cached_json_response(cache_key, etag)
+    if cached is not None:
+        return cached
+
+    posts_query = db.query(Posts).filter(Posts.owner_id == user_id)
+
+    query_posts, next_cursor = paginate(
+        posts_query, Posts.created_at, Posts.id, limit=limit, cursor=cursor
+    )
 
     if not query_posts:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Posts not found"
         )
 
-    return [
-        PostResponse(
-            id=post.id,
-            created_by=post.created_by,
-            tagged_users=post.get_tagged_user(),
-            post_content=post.content,
-            image_url=f"{BASE_URL}/static/{post.image_url or 'avatar.png'}",
-            created_at=post.created_at,
-            reaction_count=len(post.reactions),
-            reactions=[
-                ReactionListResponse(
-                    id=reaction.id,
-                    owner=reaction.user.username,
-                    reaction_type=reaction.reaction_type,
-                    reaction_count=len(post.reactions),
-                )
-                for reaction in post.reactions
-            ],
-            comment_count=len(post.comments),
-            comments=[
-                GetComments(
-                    id=comment.id,
-                    created_by=comment.user.username,
-                    comment_content=comment.content,
-                    created_at=comment.created_at,
-                    reaction_count=len(comment.reactions),
-                    reactions=[
-                        GetReactions(
-                            id=comment_reaction.id,
-                            owner=comment_reaction.user.username,
-                            reaction_type=comment_reaction.reaction_type,
-                        )
-                        for comment_reaction in comment.reactions
-                    ],
-                    reply_count=len(comment.replies),
-                    reply=[
-                        GetReplies(
-                            id=reply.id,
-                            created_by=reply.user.username,
-                            reply_content=reply.content,
-                            created_at=reply.created_at,
-                            reaction_count=len(reply.reactions),
-                            reactions=[
-                                GetReactions(
-                                    id=reply_reactions.id,
-                                    owner=reply_reactions.user.username,
-                                    reaction_type=reply_reactions.reaction_type,
-                                )
-                                for reply_reactions in reply.reactions
-                            ],
-                        )
-                        for reply in comment.replies
-                    ],
-                )
-                for comment in post.comments
-            ],
-        )
-        for post in query_posts
-    ]
+    posts = load_post_responses(db, query_posts, expansion)
+
+    return cache_json_response(
+        cache_key,
+        PostPage(posts=posts, next_cursor=next_cursor),
+        _page_tags(posts, timeline_head_tag(user_id), cursor),
+        etag,
+    )
+
+
+@router.get(
+    "/{post_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=PostResponse,
+    response_model_exclude_unset=True,
+)
+async def get_post(
+    db: db_dependency,
+    viewer: optional_user_dependency,
+    post_id: int = Path(gt=0),
+    expand: str = Query("all", description=EXPAND_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+):
+    expansion = parse_expand(expand, viewer_id=viewer.get("id") if viewer else None)
+
+    cache_key = ("post", post_id, expansion)
+    query_post = get_post_or_404(db=db, post_id=post_id)
+
+    etag = make_etag(
+        cache_key,
+        query_post.version,
+        get_versions(db, VersionedResource.USERNAMES),
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+
+    cached = cached_json_response(cache_key, etag)
+    if cached is not None:
+        return cached
+
+    post = load_post_responses(db, [query_post], expansion)[0]
+
+    return cache_json_response(cache_key, post, {post_tag(post_id)}, etag)
 
 
 @router.post(
@@ -193,22 +314,22 @@ async def create_post(
     user: user_dependency,
     db: db_dependency,
     post_request: PostCreate,
+    background_tasks: BackgroundTasks,
 ):
     check_auth = is_user_authenticated(user)
-    tagged_users = post_request.tagged_users
+    tagged_users = list(dict.fromkeys(post_request.tagged_users))
 
-    for username in tagged_users:
-        if username == check_auth.get("username"):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User can't tag themself",
-            )
-
-        check_tagged_users = db.query(Users).filter(Users.username == username).first()
-        if check_tagged_users is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="User to tag not found"
-            )
+    if check_auth.get("username") in tagged_users:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User can't tag themself",
+        )
+
+    tagged_user_ids = resolve_usernames(db, tagged_users)
+    if len(tagged_user_ids) != len(tagged_users):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User to tag not found"
+        )
 
     post_model = Posts(
         created_by=check_auth.get("username"),
@@ -218,18 +339,24 @@ async def create_post(
         created_at=datetime.now(pytz.utc),
     )
 
-    post_model.set_tagged_user(tagged_users)
+    post_model.tags = [
+        PostTags(user_id=tagged_user_ids[username], created_at=post_model.created_at)
+        for username in tagged_users
+    ]
 
     db.add(post_model)
     db.commit()
     db.refresh(post_model)
 
+    background_tasks.add_task(fan_out_post, post_model.id)
+    invalidate_new_post(post_model.owner_id)
+
     return {
         "detail": "Post created successfully",
         "post_details": PostResponse(
             id=check_auth.get("id"),
             created_by=check_auth.get("username"),
-            tagged_users=post_model.get_tagged_user(),
+            tagged_users=tagged_users,
             post_content=post_model.content,
             created_at=post_model.created_at,
         ),
@@ -257,6 +384,7 @@ async def update_post(
 
     db.add(query_post)
     db.commit()
+    invalidate_post(posts_id)
 
     return {"detail": "Post updated successfully"}
 
@@ -281,6 +409,7 @@ async def upload_image_to_post(
 
     query_post.image_url = image
     db.commit()
+    invalidate_post(post_id)
 
     return {"detail": "Image on post uploaded successfully"}
 
@@ -300,6 +429,7 @@ async def update_image_on_post(
 
         query_post.image_url = image
         db.commit()
+        invalidate_post(post_id)
 
         return {"detail": "Image on post updated successfully"}
 
@@ -321,6 +451,7 @@ async def remove_image_from_post(
 
     query_post.image_url = image
     db.commit()
+    invalidate_post(post_id)
 
     return {"detail": "Image removed from post"}
 
@@ -344,38 +475,28 @@ async def add_user_tag(
             detail="Not authorized to update this post",
         )
 
-    if query_post.tagged_user:
-        try:
-            existing_tags = json.loads(query_post.tagged_user)
-            if existing_tags:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Post already has user tags",
-                )
-
-        except json.JSONDecodeError:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Server error: tagged_user data is invalid JSON",
-            )
-
-    for username in user_tag.tagged_users:
-        if username == check_auth.get("username"):
-            raise HTTPException(status_code=400, detail="User can't tag themselves")
-
-        if query_post.is_user_tagged(username):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"User '{username}' already tagged",
-            )
-
-        tagged_user = db.query(Users).filter(Users.username == username).first()
-        if not tagged_user:
+    if query_post.tags:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Post already has user tags",
+        )
+
+    tagged_users = list(dict.fromkeys(user_tag.tagged_users))
+
+    if check_auth.get("username") in tagged_users:
+        raise HTTPException(status_code=400, detail="User can't tag themselves")
+
+    tagged_user_ids = resolve_usernames(db, tagged_users)
+    for username in tagged_users:
+        if username not in tagged_user_ids:
             raise HTTPException(status_code=404, detail=f"User '{username}' not found")
 
-    query_post.tagged_user = json.dumps(user_tag.tagged_users)
+    query_post.tags = [
+        PostTags(user_id=tagged_user_ids[username], created_at=query_post.created_at)
+        for username in tagged_users
+    ]
     db.commit()
-    db.refresh(query_post)
+    invalidate_post(post_id)
 
     return {"detail": "Added user tag successfully"}
 
@@ -393,15 +514,14 @@ async def remove_user_tags(
             detail="Not authorized to update this post",
         )
 
-    if query_post.tagged_user is None:
+    if not query_post.tags:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Post has no user tags"
         )
 
-    db.query(Posts).filter(Posts.id == post_id).update(
-        {Posts.tagged_user: json.dumps([])}
-    )
+    query_post.tags = []
     db.commit()
+    invalidate_post(post_id)
 
     return {"detail": "Tagged users removed from post"}
 
@@ -421,5 +541,7 @@ async def delete_post(
 
     db.delete(query_post)
     db.commit()
+    invalidate_post(post_id)
+    forget_trending_post(post_id)
 
     return {"detail": "Post deleted successully"}
@@ -1,8 +1,33 @@
-from fastapi import APIRouter, HTTPException, Path
+from fastapi import APIRouter, HTTPException, Path, Query
 from starlette import status
-from db import db_dependency, Reactions
+from typing import Optional
+from constants import ReactionType
+from db import db_dependency, Reactions, Users
 from .users import user_dependency
-from schemes import Reaction, ReactionResponse
+from schemes import (
+    Reaction,
+    ReactionResponse,
+    GetReactions,
+    ReactorPage,
+    ReactionSet,
+    ReactionSetResponse,
+    ReactionBatch,
+    ReactionBatchResponse,
+)
+from services import (
+    invalidate_post,
+    record_reaction,
+    reaction_target,
+    set_reaction,
+    add_reaction,
+    clear_reaction,
+    apply_reaction_batch,
+    reaction_target_exists,
+    REACTION_BUFFERING,
+    queued_reaction,
+    buffer_reaction,
+    wait_for_reactions,
+)
 from utils import (
     is_user_authenticated,
     get_post_or_404,
@@ -10,11 +35,255 @@ from utils import (
     get_reply_or_404,
     get_reaction_or_404,
     get_existing_reaction,
+    paginate_by_id,
 )
 
 router = APIRouter()
 
 
+def _reactor_page(db, target, reaction_type, limit: int, cursor: Optional[str]):
+    query = (
+        db.query(Reactions.id, Reactions.reaction_type, Users.username)
+        .join(Users, Users.id == Reactions.owner_id)
+        .filter(*target)
+    )
+    if reaction_type is not None:
+        query = query.filter(Reactions.reaction_type == reaction_type)
+
+    rows, next_cursor = paginate_by_id(query, Reactions.id, limit=limit, cursor=cursor)
+
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Reactions not found"
+        )
+
+    return ReactorPage(
+        reactions=[
+            GetReactions(
+                id=row.id, owner=row.username, reaction_type=row.reaction_type
+            )
+            for row in rows
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get(
+    "/{post_id}/reactions", status_code=status.HTTP_200_OK, response_model=ReactorPage
+)
+async def get_post_reactions(
+    db: db_dependency,
+    post_id: int = Path(gt=0),
+    reaction_type: Optional[ReactionType] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+):
+    target = reaction_target(post_id)
+    return _reactor_page(db, target, reaction_type, limit=limit, cursor=cursor)
+
+
+@router.get(
+    "/{post_id}/comment/{comment_id}/reactions",
+    status_code=status.HTTP_200_OK,
+    response_model=ReactorPage,
+)
+async def get_comment_reactions(
+    db: db_dependency,
+    post_id: int = Path(gt=0),
+    comment_id: int = Path(gt=0),
+    reaction_type: Optional[ReactionType] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+):
+    target = reaction_target(post_id, comment_id)
+    return _reactor_page(db, target, reaction_type, limit=limit, cursor=cursor)
+
+
+@router.get(
+    "/{post_id}/comment/{comment_id}/reply/{reply_id}/reactions",
+    status_code=status.HTTP_200_OK,
+    response_model=ReactorPage,
+)
+async def get_reply_reactions(
+    db: db_dependency,
+    post_id: int = Path(gt=0),
+    comment_id: int = Path(gt=0),
+    reply_id: int = Path(gt=0),
+    reaction_type: Optional[ReactionType] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+):
+    target = reaction_target(post_id, comment_id, reply_id)
+    return _reactor_page(db, target, reaction_type, limit=limit, cursor=cursor)
+
+
+async def _buffer_reaction(db, user_id: int, reaction_request: ReactionSet, *target):
+    reaction_type = reaction_request.reaction_type
+    if reaction_type is None:
+        await buffer_reaction(db, user_id, None, *target)
+        return ReactionSetResponse(detail="Reaction cleared")
+
+    if not reaction_target_exists(db, *target) or not await buffer_reaction(
+        db, user_id, reaction_type, *target
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Reaction target not found"
+        )
+    return ReactionSetResponse(detail="Reaction saved", reaction_type=reaction_type)
+
+
+async def _put_reaction(db, user_id: int, reaction_request: ReactionSet, *target):
+    if REACTION_BUFFERING:
+        return await _buffer_reaction(db, user_id, reaction_request, *target)
+
+    if reaction_request.reaction_type is None:
+        cleared = clear_reaction(db, user_id, *target)
+        db.commit()
+        if cleared:
+            invalidate_post(target[0])
+        return ReactionSetResponse(detail="Reaction cleared")
+
+    if not set_reaction(db, user_id, reaction_request.reaction_type, *target):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Reaction target not found"
+        )
+    db.commit()
+    invalidate_post(target[0])
+    record_reaction(target[0])
+
+    return ReactionSetResponse(
+        detail="Reaction saved", reaction_type=reaction_request.reaction_type
+    )
+
+
+@router.put(
+    "/{post_id}/reaction",
+    status_code=status.HTTP_200_OK,
+    response_model=ReactionSetResponse,
+)
+async def set_post_reaction(
+    user: user_dependency,
+    db: db_dependency,
+    reaction_request: ReactionSet,
+    post_id: int = Path(gt=0),
+):
+    check_auth = is_user_authenticated(user)
+    return await _put_reaction(db, check_auth.get("id"), reaction_request, post_id)
+
+
+@router.put(
+    "/{post_id}/comment/{comment_id}/reaction",
+    status_code=status.HTTP_200_OK,
+    response_model=ReactionSetResponse,
+)
+async def set_comment_reaction(
+    user: user_dependency,
+    db: db_dependency,
+    reaction_request: ReactionSet,
+    post_id: int = Path(gt=0),
+    comment_id: int = Path(gt=0),
+):
+    check_auth = is_user_authenticated(user)
+    return await _put_reaction(
+        db, check_auth.get("id"), reaction_request, post_id, comment_id
+    )
+
+
+@router.put(
+    "/{post_id}/comment/{comment_id}/reply/{reply_id}/reaction",
+    status_code=status.HTTP_200_OK,
+    response_model=ReactionSetResponse,
+)
+async def set_reply_reaction(
+    user: user_dependency,
+    db: db_dependency,
+    reaction_request: ReactionSet,
+    post_id: int = Path(gt=0),
+    comment_id: int = Path(gt=0),
+    reply_id: int = Path(gt=0),
+):
+    check_auth = is_user_authenticated(user)
+    return await _put_reaction(
+        db, check_auth.get("id"), reaction_request, post_id, comment_id, reply_id
+    )
+
+
+def _has_reaction(db, user_id: int, post_id: int, comment_id=None, reply_id=None):
+    queued, reaction_type = queued_reaction(user_id, post_id, comment_id, reply_id)
+    if queued:
+        return reaction_type is not None
+    existing = get_existing_reaction(
+        db=db,
+        user_id=user_id,
+        post_id=post_id,
+        comment_id=comment_id,
+        reply_id=reply_id,
+    )
+    return existing is not None
+
+
+async def _add_reaction(db, reaction_model: Reactions, already_reacted: str):
+    if REACTION_BUFFERING:
+        saved = await buffer_reaction(
+            db,
+            reaction_model.owner_id,
+            reaction_model.reaction_type,
+            reaction_model.post_id,
+            reaction_model.comment_id,
+            reaction_model.reply_id,
+        )
+        if not saved:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Reaction target not found",
+            )
+        return
+
+    # Two identical requests can both pass the check in the handler; the
+    # second then inserts nothing instead of failing on the unique index.
+    added = add_reaction(
+        db,
+        reaction_model.owner_id,
+        reaction_model.reaction_type,
+        reaction_model.post_id,
+        reaction_model.comment_id,
+        reaction_model.reply_id,
+    )
+    if not added:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=already_reacted
+        )
+    db.commit()
+    invalidate_post(reaction_model.post_id)
+    record_reaction(reaction_model.post_id)
+
+
+@router.post(
+    "/reactions:batch",
+    status_code=status.HTTP_200_OK,
+    response_model=ReactionBatchResponse,
+)
+async def apply_reactions(
+    user: user_dependency, db: db_dependency, batch_request: ReactionBatch
+):
+    check_auth = is_user_authenticated(user)
+    results = apply_reaction_batch(db, check_auth.get("id"), batch_request.operations)
+    db.commit()
+
+    applied = {
+        (operation.post_id, operation.comment_id, operation.reply_id): operation
+        for operation, result in zip(batch_request.operations, results)
+        if result.status_code == status.HTTP_200_OK
+    }
+    for post_id in {post_id for post_id, _, _ in applied}:
+        invalidate_post(post_id)
+    for (post_id, _, _), operation in applied.items():
+        if operation.reaction_type is not None:
+            record_reaction(post_id)
+
+    return ReactionBatchResponse(results=results)
+
+
 @router.post(
     "/{post_id}/reaction",
     status_code=status.HTTP_201_CREATED,
@@ -29,11 +298,7 @@ async def add_reaction_to_post(
     check_auth = is_user_authenticated(user)
     query_post = get_post_or_404(db=db, post_id=post_id)
 
-    existing = get_existing_reaction(
-        db=db, user_id=check_auth.get("id"), post_id=post_id
-    )
-
-    if existing:
+    if _has_reaction(db, check_auth.get("id"), post_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User already reacted to post",
@@ -45,8 +310,7 @@ async def add_reaction_to_post(
         reaction_type=reaction_request.reaction_type,
     )
 
-    db.add(reaction_model)
-    db.commit()
+    await _add_reaction(db, reaction_model, "User already reacted to post")
 
     return ReactionResponse(
         detail="Reaction added to post",
@@ -71,11 +335,7 @@ async def add_reaction_to_comment(
     query_post = get_post_or_404(db=db, post_id=post_id)
     query_comment = get_comment_or_404(db=db, comment_id=comment_id)
 
-    existing = get_existing_reaction(
-        db=db, user_id=check_auth.get("id"), comment_id=comment_id
-    )
-
-    if existing:
+    if _has_reaction(db, check_auth.get("id"), post_id, comment_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User already reacted to comment",
@@ -94,8 +354,7 @@ async def add_reaction_to_comment(
         reaction_type=reaction_request.reaction_type,
     )
 
-    db.add(reaction_model)
-    db.commit()
+    await _add_reaction(db, reaction_model, "User already reacted to comment")
 
     return ReactionResponse(
         detail="Reaction added to comment",
@@ -128,11 +387,7 @@ async def add_reaction_to_reply(
             status_code=status.HTTP_404_NOT_FOUND, detail="Reply not found"
         )
 
-    existing = get_existing_reaction(
-        db=db, user_id=check_auth.get("id"), reply_id=reply_id
-    )
-
-    if existing:
+    if _has_reaction(db, check_auth.get("id"), post_id, comment_id, reply_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User already reacted to reply",
@@ -152,8 +407,7 @@ async def add_reaction_to_reply(
         reaction_type=reaction_request.reaction_type,
     )
 
-    db.add(reaction_model)
-    db.commit()
+    await _add_reaction(db, reaction_model, "User already reacted to reply")
 
     return ReactionResponse(
         detail="Reaction added to comment",
@@ -177,6 +431,7 @@ async def update_post_reaction(
     reaction_id: int = Path(gt=0),
 ):
     check_auth = is_user_authenticated(user)
+    await wait_for_reactions(check_auth.get("id"))
     query_post = get_post_or_404(db=db, post_id=post_id)
     query_reaction = get_reaction_or_404(
         db=db, reaction_id=reaction_id, action="update"
@@ -192,6 +447,7 @@ async def update_post_reaction(
 
     db.add(query_reaction)
     db.commit()
+    invalidate_post(query_reaction.post_id)
 
     return ReactionResponse(
         detail="Reaction type updated successfully",
@@ -214,6 +470,7 @@ async def update_comment_reaction(
     reaction_id: int = Path(gt=0),
 ):
     check_auth = is_user_authenticated(user)
+    await wait_for_reactions(check_auth.get("id"))
     query_post = get_post_or_404(db=db, post_id=post_id)
     query_comment = get_comment_or_404(db=db, comment_id=comment_id)
 
@@ -237,6 +494,7 @@ async def update_comment_reaction(
 
     db.add(query_reaction)
     db.commit()
+    invalidate_post(query_reaction.post_id)
 
     return ReactionResponse(
         detail="Reaction type updated successfully",
@@ -261,6 +519,7 @@ async def update_reply_reaction(
     reaction_id: int = Path(gt=0),
 ):
     check_auth = is_user_authenticated(user)
+    await wait_for_reactions(check_auth.get("id"))
     query_post = get_post_or_404(db=db, post_id=post_id)
     query_comment = get_comment_or_404(db=db, comment_id=comment_id)
 
@@ -292,6 +551,7 @@ async def update_reply_reaction(
 
     db.add(query_reaction)
     db.commit()
+    invalidate_post(query_reaction.post_id)
 
     return ReactionResponse(
         detail="Reaction type updated successfully",
@@ -313,6 +573,7 @@ async def undo_post_reaction(
     reaction_id: int = Path(gt=0),
 ):
     check_auth = is_user_authenticated(user)
+    await wait_for_reactions(check_auth.get("id"))
     get_post_or_404(db=db, post_id=post_id)
     query_reactiom = get_reaction_or_404(db=db, reaction_id=reaction_id, action="undo")
 
@@ -324,6 +585,7 @@ async def undo_post_reaction(
 
     db.delete(query_reactiom)
     db.commit()
+    invalidate_post(query_reactiom.post_id)
 
     return {"detail": "Reaction deleted successfully"}
 
@@ -340,6 +602,7 @@ async def undo_comment_reaction(
     reaction_id: int = Path(gt=0),
 ):
     check_auth = is_user_authenticated(user)
+    await wait_for_reactions(check_auth.get("id"))
     get_post_or_404(db=db, post_id=post_id)
     query_comment = get_comment_or_404(db=db, comment_id=comment_id)
 
@@ -359,6 +622,7 @@ async def undo_comment_reaction(
 
     db.delete(query_reaction)
     db.commit()
+    invalidate_post(query_reaction.post_id)
 
     return {"detail": "Reaction deleted successfully"}
 
@@ -376,6 +640,7 @@ async def undo_reply_reaction(
     reaction_id: int = Path(gt=0),
 ):
     check_auth = is_user_authenticated(user)
+    await wait_for_reactions(check_auth.get("id"))
     get_post_or_404(db=db, post_id=post_id)
     query_comment = get_comment_or_404(db=db, comment_id=comment_id)
 
@@ -403,5 +668,6 @@ async def undo_reply_reaction(
 
     db.delete(query_reaction)
     db.commit()
+    invalidate_post(query_reaction.post_id)
 
     return {"detail": "Reaction deleted successfully"}
@@ -1,44 +1,135 @@
-from fastapi import APIRouter, HTTPException, Path
+from fastapi import APIRouter, HTTPException, Path, Query
 from starlette import status
 from datetime import datetime
 import pytz
 from db import db_dependency, CommentReply
-from .users import user_dependency
+from typing import Optional
+from .users import user_dependency, optional_user_dependency
 from utils import (
     is_user_authenticated,
     get_reply_or_404,
     get_comment_or_404,
     get_post_or_404,
+    paginate_by_key,
+)
+from schemes import (
+    ReplyCreate,
+    ReplyResponse,
+    ReplyUpdateResponse,
+    ReplyUpdate,
+    ReplyPage,
+)
+from services import (
+    invalidate_post,
+    record_reply,
+    load_reply_responses,
+    reply_subtree,
+    parse_expand,
+    EXPAND_DESCRIPTION,
 )
-from schemes import ReplyCreate, ReplyResponse, ReplyUpdateResponse, ReplyUpdate
 
 router = APIRouter()
 
 
-@router.post(
-    "/{post_id}/comment/{comment_id}/reply", status_code=status.HTTP_201_CREATED
+def _reply_page(db, comment_id: int, criteria, limit: int, cursor, expansion):
+    query_replies, next_cursor = paginate_by_key(
+        db.query(CommentReply).filter(CommentReply.comment_id == comment_id, *criteria),
+        CommentReply.path,
+        limit=limit,
+        cursor=cursor,
+    )
+
+    if not query_replies:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No replies found"
+        )
+
+    return ReplyPage(
+        replies=load_reply_responses(db, query_replies, expansion),
+        next_cursor=next_cursor,
+    )
+
+
+def _get_thread_reply_or_404(db, post_id: int, comment_id: int, reply_id: int):
+    query_reply = get_reply_or_404(db=db, reply_id=reply_id)
+
+    if query_reply.comment_id != comment_id or query_reply.post_id != post_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Reply does not belong to the given comment",
+        )
+    return query_reply
+
+
+@router.get(
+    "/{post_id}/comment/{comment_id}/replies",
+    status_code=status.HTTP_200_OK,
+    response_model=ReplyPage,
+    response_model_exclude_unset=True,
 )
-async def create_reply(
-    user: user_dependency,
+async def get_comment_replies(
     db: db_dependency,
-    reply_request: ReplyCreate,
+    viewer: optional_user_dependency,
     post_id: int = Path(gt=0),
     comment_id: int = Path(gt=0),
+    depth: Optional[int] = Query(None, ge=1, description="Levels of replies"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    expand: str = Query("all", description=EXPAND_DESCRIPTION),
 ):
-    check_auth = is_user_authenticated(user)
-    query_post = get_post_or_404(db=db, post_id=post_id)
     query_comment = get_comment_or_404(db=db, comment_id=comment_id)
 
+    if query_comment.post_id != post_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Comment does not belong to the given post",
+        )
+
+    expansion = parse_expand(expand, viewer_id=viewer.get("id") if viewer else None)
+    criteria = reply_subtree(depth=depth)
+    return _reply_page(db, comment_id, criteria, limit, cursor, expansion)
+
+
+@router.get(
+    "/{post_id}/comment/{comment_id}/reply/{reply_id}/replies",
+    status_code=status.HTTP_200_OK,
+    response_model=ReplyPage,
+    response_model_exclude_unset=True,
+)
+async def get_reply_thread(
+    db: db_dependency,
+    viewer: optional_user_dependency,
+    post_id: int = Path(gt=0),
+    comment_id: int = Path(gt=0),
+    reply_id: int = Path(gt=0),
+    depth: Optional[int] = Query(None, ge=1, description="Levels of replies"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    expand: str = Query("all", description=EXPAND_DESCRIPTION),
+):
+    query_reply = _get_thread_reply_or_404(db, post_id, comment_id, reply_id)
+
+    expansion = parse_expand(expand, viewer_id=viewer.get("id") if viewer else None)
+    criteria = reply_subtree(query_reply, depth=depth)
+    return _reply_page(db, comment_id, criteria, limit, cursor, expansion)
+
+
+def _create_reply(
+    db, user_id: int, reply_request: ReplyCreate, query_post, query_comment, parent=None
+):
     reply_model = CommentReply(
-        owner_id=check_auth.get("id"),
-        post_id=post_id,
-        comment_id=comment_id,
+        owner_id=user_id,
+        post_id=query_post.id,
+        comment_id=query_comment.id,
+        parent_id=parent.id if parent else None,
         content=reply_request.reply_content,
         created_at=datetime.now(pytz.utc),
     )
 
     db.add(reply_model)
     db.commit()
+    invalidate_post(query_post.id)
+    record_reply(query_post.id)
 
     return ReplyResponse(
         detail="Reply added successfully",
@@ -47,11 +138,53 @@ async def create_reply(
         comment_id=query_comment.id,
         comment_content=query_comment.content,
         reply_id=reply_model.id,
+        parent_id=reply_model.parent_id,
         reply_content=reply_model.content,
         created_at=reply_model.created_at,
     )
 
 
+@router.post(
+    "/{post_id}/comment/{comment_id}/reply", status_code=status.HTTP_201_CREATED
+)
+async def create_reply(
+    user: user_dependency,
+    db: db_dependency,
+    reply_request: ReplyCreate,
+    post_id: int = Path(gt=0),
+    comment_id: int = Path(gt=0),
+):
+    check_auth = is_user_authenticated(user)
+    query_post = get_post_or_404(db=db, post_id=post_id)
+    query_comment = get_comment_or_404(db=db, comment_id=comment_id)
+
+    return _create_reply(
+        db, check_auth.get("id"), reply_request, query_post, query_comment
+    )
+
+
+@router.post(
+    "/{post_id}/comment/{comment_id}/reply/{reply_id}/reply",
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_nested_reply(
+    user: user_dependency,
+    db: db_dependency,
+    reply_request: ReplyCreate,
+    post_id: int = Path(gt=0),
+    comment_id: int = Path(gt=0),
+    reply_id: int = Path(gt=0),
+):
+    check_auth = is_user_authenticated(user)
+    query_post = get_post_or_404(db=db, post_id=post_id)
+    query_comment = get_comment_or_404(db=db, comment_id=comment_id)
+    parent = _get_thread_reply_or_404(db, post_id, comment_id, reply_id)
+
+    return _create_reply(
+        db, check_auth.get("id"), reply_request, query_post, query_comment, parent
+    )
+
+
 @router.put(
     "/{post_id}/comment/{comment_id}/reply/{reply_id}",
     status_code=status.HTTP_200_OK,
@@ -81,6 +214,7 @@ async def update_reply(
 
     db.add(query_reply)
     db.commit()
+    invalidate_post(query_reply.post_id)
 
     return ReplyUpdateResponse(
         detail="Reply updated successfully",
@@ -121,5 +255,6 @@ async def delete_reply(
 
     db.delete(query_reply)
     db.commit()
+    invalidate_post(post_id)
 
     return {"detail": "Reply deleted successfully"}
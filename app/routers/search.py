@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException, Query
+from starlette import status
+from typing import Optional
+from db import db_dependency
+from schemes import SearchPage
+from services import search
+
+router = APIRouter()
+
+
+@router.get("", status_code=status.HTTP_200_OK, response_model=SearchPage)
+async def search_content(
+    db: db_dependency,
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+):
+    results, next_cursor = search(db, q, limit=limit, cursor=cursor)
+
+    if not results:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No results found"
+        )
+
+    return SearchPage(results=results, next_cursor=next_cursor)
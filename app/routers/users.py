@@ -1,58 +1,135 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
+from fastapi import (
+    APIRouter,
+    File,
+    UploadFile,
+    HTTPException,
+    Depends,
+    Header,
+    Path,
+    Query,
+    Response,
+)
 from starlette import status
-from db import db_dependency, Users, Follows
+from db import db_dependency, Users, Posts, PostTags
+from constants import VersionedResource
 from schemes import (
     UserUpdate,
     UserEmailUpdate,
     GetUserResponse,
     UserVerification,
     UserResponse,
+    UserPage,
+    PostPage,
+)
+from typing import Annotated, Optional
+from services import (
+    upload_image,
+    update_image,
+    remove_image,
+    wants_ndjson,
+    ndjson_response,
+    invalidate_all_posts,
+    forget_usernames,
+    load_post_responses,
+    parse_expand,
+    EXPAND_DESCRIPTION,
+    get_versions,
+    make_etag,
+    etag_matches,
+    not_modified_response,
+    revoke_user_tokens,
+    hash_password,
+    verify_password,
 )
-from typing import Annotated, List
-from services import upload_image, update_image, remove_image
-from .auth import get_current_user, bcrypt_context
-from sqlalchemy.orm import joinedload
+from .auth import get_current_user, get_optional_user
 import os
-from utils import load_environment, is_user_authenticated, get_user
+from utils import (
+    load_environment,
+    is_user_authenticated,
+    get_user,
+    paginate,
+    paginate_by_key,
+)
 
 router = APIRouter()
 
 user_dependency = Annotated[dict, Depends(get_current_user)]
+optional_user_dependency = Annotated[Optional[dict], Depends(get_optional_user)]
 
 load_environment()
 BASE_URL = os.getenv("BASE_URL")
 
 
-@router.get("", status_code=status.HTTP_200_OK, response_model=List[GetUserResponse])
-async def get_users(db: db_dependency):
-    query_users = (
-        db.query(Users)
-        .options(
-            joinedload(Users.followers).joinedload(Follows.follower_user),
-            joinedload(Users.following).joinedload(Follows.followed_user),
-        )
-        .all()
-    )
+# Sorts after any character that can follow a prefix in a username.
+_PREFIX_END = chr(0x10FFFF)
 
-    if not query_users:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="No users found"
-        )
 
+def _username_prefix(prefix: str):
+    """Criteria matching usernames that start with ``prefix``.
+
+    A range rather than LIKE, so SQLite can seek the unique username index
+    and the match stays case-sensitive like usernames themselves.
+    """
+    return Users.username >= prefix, Users.username < prefix + _PREFIX_END
+
+
+def _user_responses(db, users):
     return [
         GetUserResponse(
             id=user.id,
             username=user.username,
             bio=user.bio,
             avatar=f"{BASE_URL}/static/{user.avatar or 'avatar.png'}",
-            followers=len([f for f in user.followers if f.follower_user]),
-            following=len([f for f in user.following if f.followed_user]),
+            followers=user.follower_count,
+            following=user.following_count,
             is_active=user.is_active,
         )
-        for user in query_users
+        for user in users
     ]
 
 
+@router.get("", status_code=status.HTTP_200_OK, response_model=UserPage)
+async def get_users(
+    response: Response,
+    db: db_dependency,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    username: Optional[str] = Query(
+        None, min_length=1, description="Only users whose username starts with this"
+    ),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    users_query = db.query(Users)
+    if username:
+        users_query = users_query.filter(*_username_prefix(username))
+
+    if wants_ndjson(accept):
+        return ndjson_response(users_query.order_by(Users.id), _user_responses)
+
+    etag = make_etag(
+        "users",
+        limit,
+        cursor,
+        username,
+        get_versions(db, VersionedResource.USERS, VersionedResource.FOLLOWS),
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+    response.headers["ETag"] = etag
+
+    query_users, next_cursor = paginate_by_key(
+        users_query, Users.username, limit=limit, cursor=cursor
+    )
+
+    if not query_users:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No users found"
+        )
+
+    return UserPage(users=_user_responses(db, query_users), next_cursor=next_cursor)
+
+
 @router.get(
     "/current_user", status_code=status.HTTP_200_OK, response_model=UserResponse
 )
@@ -76,6 +153,47 @@ async def get_current_user_details(user: user_dependency, db: db_dependency):
     )
 
 
+@router.get(
+    "/{user_id}/tagged_posts",
+    status_code=status.HTTP_200_OK,
+    response_model=PostPage,
+    response_model_exclude_unset=True,
+)
+async def get_tagged_posts(
+    db: db_dependency,
+    viewer: optional_user_dependency,
+    user_id: int = Path(gt=0),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    expand: str = Query("all", description=EXPAND_DESCRIPTION),
+):
+    expansion = parse_expand(expand, viewer_id=viewer.get("id") if viewer else None)
+
+    tags, next_cursor = paginate(
+        db.query(PostTags.post_id, PostTags.created_at).filter(
+            PostTags.user_id == user_id
+        ),
+        PostTags.created_at,
+        PostTags.post_id,
+        limit=limit,
+        cursor=cursor,
+    )
+
+    if not tags:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Posts not found"
+        )
+
+    posts_by_id = {
+        post.id: post
+        for post in db.query(Posts).filter(Posts.id.in_([tag.post_id for tag in tags]))
+    }
+    query_posts = [posts_by_id[tag.post_id] for tag in tags]
+    posts = load_post_responses(db, query_posts, expansion)
+
+    return PostPage(posts=posts, next_cursor=next_cursor)
+
+
 @router.post("/upload_profile_picture", status_code=status.HTTP_200_OK)
 async def upload_profile_picture(
     user: user_dependency, db: db_dependency, file: UploadFile = File(...)
@@ -139,15 +257,19 @@ async def change_password(
     is_user_authenticated(user)
     query_user = get_user(db=db, user=user)
 
-    if not bcrypt_context.verify(verify_user.password, query_user.password):
+    hashed_password = query_user.password
+    # Hand the connection back to the pool while bcrypt runs.
+    db.rollback()
+    if not await verify_password(verify_user.password, hashed_password):
         return HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect password"
         )
 
-    query_user.password = bcrypt_context.hash(verify_user.new_password)
+    query_user.password = await hash_password(verify_user.new_password)
 
     db.add(query_user)
     db.commit()
+    revoke_user_tokens(query_user.id)
 
     return {"detail": "Password updated successfully"}
 
@@ -160,12 +282,15 @@ async def update_user(
 ):
     is_user_authenticated(user)
     query_user = get_user(db=db, user=user)
+    previous_username = query_user.username
     
     query_user.username = update_user_request.username
     query_user.bio = update_user_request.bio
 
     db.add(query_user)
     db.commit()
+    forget_usernames(previous_username)
+    invalidate_all_posts()
     return {"detail": "User updated successfully"}
 
 
@@ -193,9 +318,12 @@ async def deactivate_account(user: user_dependency, db: db_dependency):
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
+    username = query_user.username
     try:
         db.delete(query_user)
         db.commit()
+        forget_usernames(username)
+        invalidate_all_posts()
         return {"detail": "User and all related data deleted successfully"}
     except Exception as e:
         db.rollback()
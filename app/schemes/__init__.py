@@ -4,11 +4,39 @@ from .user import (
     UserResponse,
     UserEmailUpdate,
     GetUserResponse,
+    UserPage,
     UserVerification,
 )
 from .auth import TokenResponse, ResetPassword
-from .posts import PostCreate, PostUpdate, PostResponse, CreatePostResponse, UserTag
-from .comments import CommentCreate, CommentResponse, CommentUpdateResponse, GetComments, CommentUpdate
-from .reactions import Reaction, ReactionResponse, ReactionListResponse, GetReactions
-from .follow import GetFollower, FollowUser
-from .reply import GetReplies, ReplyCreate, ReplyResponse, ReplyUpdateResponse, ReplyUpdate
+from .posts import (
+    PostCreate,
+    PostUpdate,
+    PostResponse,
+    PostPage,
+    CreatePostResponse,
+    UserTag,
+)
+from .comments import CommentCreate, CommentResponse, CommentUpdateResponse, GetComments, CommentUpdate, CommentPage
+from .reactions import (
+    Reaction,
+    ReactionResponse,
+    ReactionListResponse,
+    GetReactions,
+    ReactionSummary,
+    ReactorPage,
+    ReactionSet,
+    ReactionSetResponse,
+    ReactionOperation,
+    ReactionBatch,
+    ReactionBatchResult,
+    ReactionBatchResponse,
+)
+from .follow import (
+    GetFollower,
+    FollowUser,
+    UserSuggestion,
+    FollowBatch,
+    FollowBatchResponse,
+)
+from .reply import GetReplies, ReplyCreate, ReplyResponse, ReplyUpdateResponse, ReplyUpdate, ReplyPage
+from .search import SearchResult, SearchPage
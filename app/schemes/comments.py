@@ -1,7 +1,7 @@
 from datetime import datetime
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List
-from .reactions import GetReactions
+from .reactions import GetReactions, ReactionSummary
 from .reply import GetReplies
 
 
@@ -12,12 +12,20 @@ class GetComments(BaseModel):
     created_at: datetime
     reaction_count: Optional[int]
     reactions: Optional[List[GetReactions]] = []
+    reactions_summary: Optional[ReactionSummary] = None
     reply_count: Optional[int] = None
     reply: Optional[List[GetReplies]] = []
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class CommentPage(BaseModel):
+    comments: List[GetComments] = []
+    next_cursor: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class CommentCreate(BaseModel):
     comment_content: str = Field(min_length=0, max_length=280)
 
@@ -1,4 +1,5 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated, List
 
 
 class GetFollower(BaseModel):
@@ -8,7 +9,35 @@ class GetFollower(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class UserSuggestion(BaseModel):
+    user_id: int
+    username: str
+    mutual_follows: int
+    shared_reactions: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class FollowUser(BaseModel):
     detail: str
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class FollowBatch(BaseModel):
+    user_ids: List[Annotated[int, Field(gt=0)]] = Field(min_length=1, max_length=1000)
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra={"example": {"user_ids": [2, 3, 5, 8]}},
+    )
+
+
+class FollowBatchResponse(BaseModel):
+    # Users followed or unfollowed by this request.
+    applied: List[int] = []
+    # Already followed, the user themselves, or not followed when unfollowing.
+    skipped: List[int] = []
+    not_found: List[int] = []
+
+    model_config = ConfigDict(from_attributes=True)
@@ -2,7 +2,7 @@ from datetime import datetime
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List
 from .comments import GetComments
-from .reactions import ReactionListResponse
+from .reactions import ReactionListResponse, ReactionSummary
 
 
 class PostCreate(BaseModel):
@@ -35,6 +35,7 @@ class PostResponse(BaseModel):
     created_at: Optional[datetime] = None
     reaction_count: Optional[int] = None
     reactions: Optional[List[ReactionListResponse]] = []
+    reactions_summary: Optional[ReactionSummary] = None
     comment_count: Optional[int] = None
     comments: Optional[List[GetComments]] = []
     # reply_count: Optional[int] = None
@@ -43,6 +44,13 @@ class PostResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class PostPage(BaseModel):
+    posts: List[PostResponse] = []
+    next_cursor: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class CreatePostResponse(BaseModel):
     detail: str
     post_details: PostResponse
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from constants import ReactionType
-from typing import Optional
+from typing import Optional, Dict, List
 
 
 class Reaction(BaseModel):
@@ -14,6 +14,70 @@ class Reaction(BaseModel):
     )
 
 
+class ReactionSet(BaseModel):
+    reaction_type: Optional[ReactionType] = None
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra={
+            "example": {"reaction_type": "like, love, haha, hate, sad or null to clear"}
+        },
+    )
+
+
+class ReactionSetResponse(BaseModel):
+    detail: str
+    reaction_type: Optional[ReactionType] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ReactionOperation(BaseModel):
+    post_id: int = Field(gt=0)
+    comment_id: Optional[int] = Field(None, gt=0)
+    reply_id: Optional[int] = Field(None, gt=0)
+    reaction_type: Optional[ReactionType] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ReactionBatch(BaseModel):
+    operations: List[ReactionOperation] = Field(min_length=1, max_length=500)
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra={
+            "example": {
+                "operations": [
+                    {"post_id": 1, "reaction_type": "love"},
+                    {"post_id": 1, "comment_id": 2, "reaction_type": "haha"},
+                    {
+                        "post_id": 3,
+                        "comment_id": 4,
+                        "reply_id": 5,
+                        "reaction_type": None,
+                    },
+                ]
+            }
+        },
+    )
+
+
+class ReactionBatchResult(BaseModel):
+    index: int
+    status_code: int
+    detail: str
+    reaction_type: Optional[ReactionType] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ReactionBatchResponse(BaseModel):
+    results: List[ReactionBatchResult] = []
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class GetReactions(BaseModel):
     id: int
     owner: str
@@ -38,3 +102,17 @@ class ReactionListResponse(BaseModel):
     reaction_type: ReactionType
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class ReactionSummary(BaseModel):
+    counts: Dict[ReactionType, int] = {}
+    viewer_reaction: Optional[ReactionType] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ReactorPage(BaseModel):
+    reactions: List[GetReactions] = []
+    next_cursor: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
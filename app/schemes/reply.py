@@ -1,16 +1,26 @@
 from datetime import datetime
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List
-from .reactions import GetReactions
+from .reactions import GetReactions, ReactionSummary
 
 
 class GetReplies(BaseModel):
     id: int
+    parent_id: Optional[int] = None
+    depth: int = 0
     created_by: str
     reply_content: str = Field(min_length=0, max_length=280)
     created_at: datetime
     reaction_count: Optional[int]
     reactions: Optional[List[GetReactions]] = []
+    reactions_summary: Optional[ReactionSummary] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ReplyPage(BaseModel):
+    replies: List[GetReplies] = []
+    next_cursor: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -41,6 +51,7 @@ class ReplyResponse(BaseModel):
     comment_id: int
     comment_content: str = Field(min_length=0, max_length=280)
     reply_id: int
+    parent_id: Optional[int] = None
     reply_content: str = Field(min_length=0, max_length=280)
     created_at: datetime
 
@@ -0,0 +1,22 @@
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
+from constants import SearchKind
+
+
+class SearchResult(BaseModel):
+    kind: SearchKind
+    id: int
+    post_id: int
+    created_by: str
+    created_at: datetime
+    snippet: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SearchPage(BaseModel):
+    results: List[SearchResult] = []
+    next_cursor: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
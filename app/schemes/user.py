@@ -1,5 +1,5 @@
 from pydantic import UUID4, BaseModel, Field, EmailStr, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from constants import UserRole
 
@@ -48,6 +48,13 @@ class GetUserResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class UserPage(BaseModel):
+    users: List[GetUserResponse] = []
+    next_cursor: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class UserResponse(BaseModel):
     id: int
     account_id: UUID4
@@ -1,3 +1,92 @@
 from .email_service import send_reset_email
 from .token_service import create_reset_token, verify_reset_token
 from .image_service import update_image, upload_image, remove_image
+from .post_loader import (
+    load_post_responses,
+    load_comment_responses,
+    load_reply_responses,
+    reply_subtree,
+    parse_expand,
+    EXPAND_DESCRIPTION,
+)
+from .counter_service import reconcile_counters
+from .feed_service import (
+    fan_out_post,
+    backfill_feed,
+    backfill_feeds,
+    remove_author_from_feed,
+    get_home_feed,
+)
+from .stream_service import wants_ndjson, ndjson_response
+from .version_service import (
+    get_versions,
+    make_etag,
+    etag_matches,
+    not_modified_response,
+)
+from .cache_service import (
+    ALL_POSTS_HEAD_TAG,
+    post_tag,
+    timeline_head_tag,
+    cached_json_response,
+    cache_json_response,
+    invalidate_post,
+    invalidate_new_post,
+    invalidate_all_posts,
+)
+from .username_service import (
+    resolve_usernames,
+    get_user_by_username,
+    forget_usernames,
+)
+from .search_service import search
+from .trending_service import (
+    record_reaction,
+    record_comment,
+    record_reply,
+    forget_trending_post,
+    get_trending_post_ids,
+    persist_trending,
+    run_trending_persistence,
+)
+from .reaction_service import (
+    reaction_target,
+    set_reaction,
+    add_reaction,
+    clear_reaction,
+    apply_reaction_batch,
+    reaction_target_exists,
+)
+from .reaction_buffer import (
+    REACTION_BUFFERING,
+    queued_reaction,
+    buffer_reaction,
+    wait_for_reactions,
+    flush_reactions,
+)
+from .follow_graph import (
+    get_follow_graph,
+    record_follow,
+    record_unfollow,
+    load_follow_graph,
+)
+from .suggestion_service import get_suggestions, invalidate_suggestions
+from .follow_service import (
+    existing_user_ids,
+    follow_many,
+    unfollow_many,
+    import_follows,
+)
+from .access_token_cache import (
+    ACCESS_TOKEN_LIFETIME_SECONDS,
+    cached_access_token,
+    cache_access_token,
+    revoke_access_token,
+    revoke_user_tokens,
+    access_token_cache_stats,
+)
+from .password_service import (
+    hash_password,
+    verify_password,
+    password_hashing_stats,
+)
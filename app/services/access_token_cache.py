@@ -0,0 +1,129 @@
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+ACCESS_TOKEN_CACHE_MAX_ENTRIES = 10_000
+ACCESS_TOKEN_LIFETIME_SECONDS = 20 * 60
+
+
+def _token_key(token: str):
+    return hashlib.sha256(token.encode()).digest()
+
+
+class AccessTokenCache:
+    """Bounded LRU cache of verified access tokens and their users.
+
+    A token's signature is checked once and later requests carrying it
+    are answered from here until its ``exp``. Entries are keyed by a hash
+    of the token, so the cache never holds a usable token. Revoked tokens
+    are remembered until they expire, and revoking a user's tokens rejects
+    every token issued to them before that moment. That is remembered for
+    ``max_token_lifetime`` seconds, after which all those tokens expired.
+    """
+
+    def __init__(self, max_entries: int, max_token_lifetime: float):
+        self.max_entries = max_entries
+        self.max_token_lifetime = max_token_lifetime
+        self._entries = OrderedDict()
+        self._revoked = {}
+        self._revoked_before = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        """The user of a cached token, or None if it has to be decoded."""
+        key = _token_key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def add(self, token: str, user: dict, expires_at: float, issued_at: float):
+        """Cache a decoded token. Returns False, caching nothing, if revoked."""
+        key = _token_key(token)
+        with self._lock:
+            if key in self._revoked or issued_at < self._revoked_before.get(
+                user["id"], 0
+            ):
+                return False
+
+            self._entries[key] = (expires_at, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def revoke(self, token: str, expires_at: float):
+        now = time.time()
+        with self._lock:
+            self._revoked = {
+                key: revoked_until
+                for key, revoked_until in self._revoked.items()
+                if revoked_until > now
+            }
+            key = _token_key(token)
+            self._revoked[key] = expires_at
+            self._entries.pop(key, None)
+
+    def revoke_user(self, user_id: int):
+        now = time.time()
+        with self._lock:
+            self._revoked_before = {
+                revoked_user_id: revoked_at
+                for revoked_user_id, revoked_at in self._revoked_before.items()
+                if revoked_at + self.max_token_lifetime > now
+            }
+            # Tokens carry whole seconds, so one issued later in this
+            # second must not count as issued before it.
+            self._revoked_before[user_id] = int(now)
+            self._entries = OrderedDict(
+                (key, entry)
+                for key, entry in self._entries.items()
+                if entry[1]["id"] != user_id
+            )
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "revoked": len(self._revoked),
+                "revoked_users": len(self._revoked_before),
+            }
+
+
+access_token_cache = AccessTokenCache(
+    max_entries=ACCESS_TOKEN_CACHE_MAX_ENTRIES,
+    max_token_lifetime=ACCESS_TOKEN_LIFETIME_SECONDS,
+)
+
+
+def cached_access_token(token: str):
+    return access_token_cache.get(token)
+
+
+def cache_access_token(token: str, user: dict, expires_at: float, issued_at: float):
+    return access_token_cache.add(token, user, expires_at, issued_at)
+
+
+def revoke_access_token(token: str, expires_at: float):
+    """Reject ``token`` from now on, e.g. after logging out."""
+    access_token_cache.revoke(token, expires_at)
+
+
+def revoke_user_tokens(user_id: int):
+    """Reject every token issued to ``user_id`` so far, e.g. on a new password."""
+    access_token_cache.revoke_user(user_id)
+
+
+def access_token_cache_stats():
+    return access_token_cache.stats()
@@ -0,0 +1,124 @@
+from collections import OrderedDict, defaultdict
+import threading
+import time
+from fastapi import Response
+
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+RESPONSE_CACHE_TTL_SECONDS = 60
+
+ALL_POSTS_HEAD_TAG = "posts:head"
+
+
+class ResponseCache:
+    """Bounded LRU cache of rendered responses with TTL expiry.
+
+    Every entry is stored with a set of tags naming what it was built from,
+    so writers can evict exactly the entries they made stale. Tags only
+    reach the cache of the worker that wrote, so an entry also keeps the
+    version of the data it was built from, and a ``get`` for any other
+    version misses. Writes made by other workers then show up at once
+    instead of after the TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._keys_by_tag = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value, _, entry_version = entry
+            if expires_at < time.monotonic() or entry_version != version:
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags, version=None):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            expires_at = time.monotonic() + self.ttl_seconds
+            self._entries[key] = (expires_at, value, tags, version)
+            for tag in tags:
+                self._keys_by_tag[tag].add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def _remove(self, key):
+        _, _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag[tag]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_tag[tag]
+
+
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS
+)
+
+
+def post_tag(post_id: int):
+    return f"post:{post_id}"
+
+
+def timeline_head_tag(user_id: int):
+    return f"timeline:{user_id}:head"
+
+
+def cached_json_response(key, etag: str):
+    """Answer from the cache if the entry was built for the current ``etag``.
+
+    The ETag is computed from the database's versions on every request, so
+    it is also the version the entry is checked against.
+    """
+    body = response_cache.get(key, version=etag)
+    if body is None:
+        return None
+    return Response(
+        content=body, media_type="application/json", headers={"ETag": etag}
+    )
+
+
+def cache_json_response(key, model, tags, etag: str):
+    body = model.model_dump_json(exclude_unset=True).encode()
+    response_cache.set(key, body, tags, version=etag)
+    return Response(
+        content=body, media_type="application/json", headers={"ETag": etag}
+    )
+
+
+def invalidate_post(post_id: int):
+    """A post or one of its comments, replies or reactions changed."""
+    response_cache.invalidate(post_tag(post_id))
+
+
+def invalidate_new_post(owner_id: int):
+    """A post was created. Keyset pages after the first can't contain it."""
+    response_cache.invalidate(ALL_POSTS_HEAD_TAG, timeline_head_tag(owner_id))
+
+
+def invalidate_all_posts():
+    """Usernames shown throughout the cached trees changed."""
+    response_cache.clear()
@@ -0,0 +1,47 @@
+from sqlalchemy import select, update, func
+from db import Posts, Comments, CommentReply, Reactions, Users, Follows
+
+
+def _count(model, *criteria):
+    return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+
+def reconcile_counters(db):
+    """Recompute every counter column from the child tables.
+
+    The counters are kept by triggers (see db/schema.py), so this is only
+    needed for databases whose counters predate them.
+    """
+    db.execute(
+        update(Posts).values(
+            reaction_count=_count(
+                Reactions,
+                Reactions.post_id == Posts.id,
+                Reactions.comment_id.is_(None),
+                Reactions.reply_id.is_(None),
+            ),
+            comment_count=_count(Comments, Comments.post_id == Posts.id),
+        )
+    )
+    db.execute(
+        update(Comments).values(
+            reaction_count=_count(
+                Reactions,
+                Reactions.comment_id == Comments.id,
+                Reactions.reply_id.is_(None),
+            ),
+            reply_count=_count(CommentReply, CommentReply.comment_id == Comments.id),
+        )
+    )
+    db.execute(
+        update(CommentReply).values(
+            reaction_count=_count(Reactions, Reactions.reply_id == CommentReply.id)
+        )
+    )
+    db.execute(
+        update(Users).values(
+            follower_count=_count(Follows, Follows.user_id == Users.id),
+            following_count=_count(Follows, Follows.follower_id == Users.id),
+        )
+    )
+    db.commit()
@@ -0,0 +1,225 @@
+from sqlalchemy import select, delete, func, literal, tuple_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import aliased
+from db import SessionLocal, Posts, Users, Follows, FeedItems
+from utils import encode_cursor, decode_cursor, batched
+from constants import FEED_MAX_ITEMS, FANOUT_FOLLOWER_LIMIT
+
+# How far a feed may run over FEED_MAX_ITEMS before it is trimmed, so a full
+# feed is cut once per this many posts rather than on every one.
+FEED_TRIM_SLACK = 50
+# Recent posts copied into a feed when its owner follows someone new.
+FOLLOW_BACKFILL_ITEMS = 20
+
+
+def _trim_feeds(db, user_ids):
+    """Cut the feeds of ``user_ids`` that outgrew the cap back down to it.
+
+    Counting a feed only walks its entries in the user_id index; the
+    ranking that picks the rows to delete runs just for feeds past the cap
+    plus its slack.
+    """
+    over_cap = [
+        row.user_id
+        for row in db.query(FeedItems.user_id)
+        .filter(FeedItems.user_id.in_(user_ids))
+        .group_by(FeedItems.user_id)
+        .having(func.count() > FEED_MAX_ITEMS + FEED_TRIM_SLACK)
+    ]
+    if not over_cap:
+        return
+
+    ranked = (
+        select(
+            FeedItems.id,
+            func.row_number()
+            .over(
+                partition_by=FeedItems.user_id,
+                order_by=(FeedItems.created_at.desc(), FeedItems.post_id.desc()),
+            )
+            .label("position"),
+        )
+        .where(FeedItems.user_id.in_(over_cap))
+        .subquery()
+    )
+    db.execute(
+        delete(FeedItems).where(
+            FeedItems.id.in_(
+                select(ranked.c.id).where(ranked.c.position > FEED_MAX_ITEMS)
+            )
+        )
+    )
+
+
+def _is_fanned_out(db, author_id: int):
+    follower_count = (
+        db.query(Users.follower_count).filter(Users.id == author_id).scalar()
+    )
+    return (follower_count or 0) <= FANOUT_FOLLOWER_LIMIT
+
+
+def fan_out_post(post_id: int):
+    """Copy a new post into the feed of every follower of its author.
+
+    Runs as a background task once the create request has been answered,
+    so it opens its own session.
+    """
+    db = SessionLocal()
+    try:
+        post = (
+            db.query(Posts.id, Posts.owner_id, Posts.created_at)
+            .filter(Posts.id == post_id)
+            .first()
+        )
+        if post is None or not _is_fanned_out(db, post.owner_id):
+            return
+
+        follower_ids = [
+            row.follower_id
+            for row in db.query(Follows.follower_id).filter(
+                Follows.user_id == post.owner_id
+            )
+        ]
+
+        for batch in batched(follower_ids):
+            db.execute(
+                insert(FeedItems).on_conflict_do_nothing(),
+                [
+                    {
+                        "user_id": follower_id,
+                        "post_id": post.id,
+                        "author_id": post.owner_id,
+                        "created_at": post.created_at,
+                    }
+                    for follower_id in batch
+                ],
+            )
+            _trim_feeds(db, batch)
+            db.commit()
+    finally:
+        db.close()
+
+
+def backfill_feed(db, follower_id: int, author_id: int):
+    """Seed a feed with an author's recent posts when they are followed."""
+    if not _is_fanned_out(db, author_id):
+        return
+
+    recent_posts = (
+        select(literal(follower_id), Posts.id, Posts.owner_id, Posts.created_at)
+        .where(Posts.owner_id == author_id)
+        .order_by(Posts.created_at.desc(), Posts.id.desc())
+        .limit(FOLLOW_BACKFILL_ITEMS)
+    )
+    db.execute(
+        insert(FeedItems)
+        .from_select(["user_id", "post_id", "author_id", "created_at"], recent_posts)
+        .on_conflict_do_nothing()
+    )
+    _trim_feeds(db, [follower_id])
+
+
+def backfill_feeds(db, edges):
+    """``backfill_feed`` for many (follower_id, author_id) follows at once.
+
+    The follows must already be inserted. One INSERT ... SELECT takes each
+    author's recent posts with a correlated LIMIT, so every edge reads just
+    the posts it copies.
+    """
+    recent = aliased(Posts)
+    recent_post_ids = (
+        select(recent.id)
+        .where(recent.owner_id == Follows.user_id)
+        .order_by(recent.created_at.desc(), recent.id.desc())
+        .limit(FOLLOW_BACKFILL_ITEMS)
+        .correlate(Follows)
+    )
+    new_items = (
+        select(Follows.follower_id, Posts.id, Posts.owner_id, Posts.created_at)
+        .select_from(Follows)
+        .join(Users, Users.id == Follows.user_id)
+        .join(Posts, Posts.owner_id == Follows.user_id)
+        .where(
+            tuple_(Follows.follower_id, Follows.user_id).in_(edges),
+            Users.follower_count <= FANOUT_FOLLOWER_LIMIT,
+            Posts.id.in_(recent_post_ids),
+        )
+    )
+    db.execute(
+        insert(FeedItems)
+        .from_select(["user_id", "post_id", "author_id", "created_at"], new_items)
+        .on_conflict_do_nothing()
+    )
+    _trim_feeds(db, {follower_id for follower_id, _ in edges})
+
+
+def remove_author_from_feed(db, follower_id: int, author_id: int):
+    db.query(FeedItems).filter(
+        FeedItems.user_id == follower_id, FeedItems.author_id == author_id
+    ).delete(synchronize_session=False)
+
+
+def get_home_feed(db, user_id: int, limit: int, cursor: str = None):
+    """Return a page of posts from the users ``user_id`` follows.
+
+    Materialized feed items are merged with the recent posts of followed
+    authors that are too large to fan out. Both sources are read newest
+    first on (created_at, post id), so one cursor pages through both.
+    """
+    feed_query = db.query(
+        FeedItems.post_id.label("post_id"), FeedItems.created_at
+    ).filter(FeedItems.user_id == user_id)
+
+    merged_authors = (
+        select(Users.id)
+        .join(Follows, Follows.user_id == Users.id)
+        .where(
+            Follows.follower_id == user_id,
+            Users.follower_count > FANOUT_FOLLOWER_LIMIT,
+        )
+    )
+    merged_query = db.query(Posts.id.label("post_id"), Posts.created_at).filter(
+        Posts.owner_id.in_(merged_authors)
+    )
+
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        feed_query = feed_query.filter(
+            tuple_(FeedItems.created_at, FeedItems.post_id)
+            < (cursor_created_at, cursor_id)
+        )
+        merged_query = merged_query.filter(
+            tuple_(Posts.created_at, Posts.id) < (cursor_created_at, cursor_id)
+        )
+
+    feed_rows = (
+        feed_query.order_by(FeedItems.created_at.desc(), FeedItems.post_id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    merged_rows = (
+        merged_query.order_by(Posts.created_at.desc(), Posts.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    # A post can be in both sources if its author crossed the fan-out limit.
+    entries = {row.post_id: row.created_at for row in (*feed_rows, *merged_rows)}
+    page = sorted(
+        entries.items(), key=lambda entry: (entry[1], entry[0]), reverse=True
+    )
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last_post_id, last_created_at = page[-1]
+        next_cursor = encode_cursor(last_created_at, last_post_id)
+
+    post_ids = [post_id for post_id, _ in page]
+    posts_by_id = {
+        post.id: post for post in db.query(Posts).filter(Posts.id.in_(post_ids))
+    }
+
+    posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+
+    return posts, next_cursor
@@ -0,0 +1,144 @@
+from array import array
+from bisect import bisect_left
+import threading
+from constants import VersionedResource
+from db import SessionLocal, Follows
+from .version_service import get_versions
+
+# Rows read at a time while building the graph.
+FOLLOW_GRAPH_LOAD_BATCH = 10_000
+
+
+def _find(ids: array, user_id: int):
+    index = bisect_left(ids, user_id)
+    return index, index < len(ids) and ids[index] == user_id
+
+
+def _insert(ids: array, user_id: int):
+    index, found = _find(ids, user_id)
+    if not found:
+        ids.insert(index, user_id)
+
+
+def _remove(ids: array, user_id: int):
+    index, found = _find(ids, user_id)
+    if found:
+        del ids[index]
+
+
+class FollowGraph:
+    """Followers and followed users of every user, as sorted id arrays.
+
+    Lists, counts and membership checks are answered from memory with a
+    binary search. Changes committed by this process are applied in place.
+    Anything else that writes follows (another worker, a deleted user's
+    follows going with them) bumps the FOLLOWS resource version like every
+    follow does, and a version the graph did not see coming rebuilds it.
+    """
+
+    def __init__(self):
+        self._followers = {}
+        self._following = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def sync(self, db):
+        """Rebuild the graph if the follows table changed behind its back."""
+        (version,) = get_versions(db, VersionedResource.FOLLOWS)
+        with self._lock:
+            if version == self._version:
+                return
+
+        followers, following = {}, {}
+        rows = (
+            db.query(Follows.follower_id, Follows.user_id)
+            .order_by(Follows.user_id, Follows.follower_id)
+            .yield_per(FOLLOW_GRAPH_LOAD_BATCH)
+        )
+        for follower_id, user_id in rows:
+            followers.setdefault(user_id, array("q")).append(follower_id)
+            following.setdefault(follower_id, array("q")).append(user_id)
+        # Rows came in user_id order, so only the following side needs it.
+        for ids in following.values():
+            ids[:] = array("q", sorted(ids))
+
+        with self._lock:
+            self._followers, self._following = followers, following
+            self._version = version
+
+    def apply(self, db, edges, following: bool):
+        """Record follows or unfollows this process has just committed.
+
+        ``edges`` are (follower_id, user_id) pairs, each of which bumped the
+        FOLLOWS version once.
+        """
+        (version,) = get_versions(db, VersionedResource.FOLLOWS)
+        with self._lock:
+            if self._version is None or version != self._version + len(edges):
+                # Other changes landed too, so these alone aren't enough.
+                self._version = None
+                return
+
+            change = _insert if following else _remove
+            for follower_id, user_id in edges:
+                change(self._followers.setdefault(user_id, array("q")), follower_id)
+                change(self._following.setdefault(follower_id, array("q")), user_id)
+            self._version = version
+
+    def followers(self, user_id: int):
+        with self._lock:
+            return array("q", self._followers.get(user_id, ()))
+
+    def following(self, user_id: int):
+        with self._lock:
+            return array("q", self._following.get(user_id, ()))
+
+    def follower_count(self, user_id: int):
+        with self._lock:
+            return len(self._followers.get(user_id, ()))
+
+    def following_count(self, user_id: int):
+        with self._lock:
+            return len(self._following.get(user_id, ()))
+
+    def follows(self, follower_id: int, user_id: int):
+        with self._lock:
+            return _find(self._following.get(follower_id, array("q")), user_id)[1]
+
+
+follow_graph = FollowGraph()
+
+
+def get_follow_graph(db):
+    """The follow graph, brought up to date with the follows table first."""
+    follow_graph.sync(db)
+    return follow_graph
+
+
+def record_follow(db, follower_id: int, user_id: int):
+    """Call after committing a new follow."""
+    follow_graph.apply(db, [(follower_id, user_id)], following=True)
+
+
+def record_unfollow(db, follower_id: int, user_id: int):
+    """Call after committing an unfollow."""
+    follow_graph.apply(db, [(follower_id, user_id)], following=False)
+
+
+def record_follows(db, edges):
+    """Call after committing new (follower_id, user_id) follows."""
+    follow_graph.apply(db, edges, following=True)
+
+
+def record_unfollows(db, edges):
+    """Call after committing removed (follower_id, user_id) follows."""
+    follow_graph.apply(db, edges, following=False)
+
+
+def load_follow_graph():
+    """Build the graph at startup instead of on the first request."""
+    db = SessionLocal()
+    try:
+        follow_graph.sync(db)
+    finally:
+        db.close()
@@ -0,0 +1,105 @@
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.sqlite import insert
+from db import Users, Follows
+from utils import batched, fetch_in
+from .feed_service import backfill_feeds, remove_author_from_feed
+from .follow_graph import record_follows, record_unfollows
+from .suggestion_service import invalidate_suggestions
+
+def existing_user_ids(db, user_ids):
+    """The ids in ``user_ids`` that belong to a user, one query per batch."""
+    return {row.id for row in fetch_in(db.query(Users.id), Users.id, set(user_ids))}
+
+
+def _after_commit(db, edges, following: bool):
+    if following:
+        record_follows(db, edges)
+    else:
+        record_unfollows(db, edges)
+    for follower_id in {follower_id for follower_id, _ in edges}:
+        invalidate_suggestions(follower_id)
+
+
+def follow_many(db, edges):
+    """Insert (follower_id, user_id) follows and commit them in batches.
+
+    Both users of every edge must exist. Edges from a user to themselves
+    are dropped. Each batch of ``BATCH_SIZE`` edges is one executemany
+    insert that skips edges already present through the unique_follow
+    constraint, followed by the feed and follow graph updates the single
+    follow route makes. Returns the edges that were inserted.
+    """
+    edges = dict.fromkeys(edge for edge in edges if edge[0] != edge[1])
+    inserted = set()
+    for batch in batched(edges):
+        statement = (
+            insert(Follows)
+            .on_conflict_do_nothing(index_elements=["user_id", "follower_id"])
+            .returning(Follows.follower_id, Follows.user_id)
+        )
+        rows = [
+            {"follower_id": follower_id, "user_id": user_id, "following_id": user_id}
+            for follower_id, user_id in batch
+        ]
+        batch_inserted = [tuple(row) for row in db.execute(statement, rows)]
+        if not batch_inserted:
+            continue
+
+        backfill_feeds(db, batch_inserted)
+        db.commit()
+        _after_commit(db, batch_inserted, following=True)
+        inserted.update(batch_inserted)
+    return inserted
+
+
+def unfollow_many(db, edges):
+    """Remove (follower_id, user_id) follows and commit them in batches.
+
+    Edges that don't exist are skipped. Returns the edges that were removed.
+    """
+    removed = set()
+    for batch in batched(dict.fromkeys(edges)):
+        pairs = tuple_(Follows.follower_id, Follows.user_id)
+        batch_removed = [
+            tuple(row)
+            for row in db.query(Follows.follower_id, Follows.user_id).filter(
+                pairs.in_(batch)
+            )
+        ]
+        if not batch_removed:
+            continue
+
+        db.query(Follows).filter(pairs.in_(batch_removed)).delete(
+            synchronize_session=False
+        )
+        for follower_id, user_id in batch_removed:
+            remove_author_from_feed(db, follower_id=follower_id, author_id=user_id)
+        db.commit()
+        _after_commit(db, batch_removed, following=False)
+        removed.update(batch_removed)
+    return removed
+
+
+def import_follows(db, edges):
+    """Import an iterable of (follower_id, user_id) follows, e.g. from a CSV.
+
+    The edges are read a batch at a time, so the input is never held in
+    memory. Returns the number of follows imported, already present, from a
+    user to themselves and naming unknown users.
+    """
+    imported = existing = self_follows = unknown = 0
+    for batch in batched(edges):
+        batch = set(batch)
+        own = {edge for edge in batch if edge[0] == edge[1]}
+        user_ids = existing_user_ids(db, set().union(*batch))
+        valid = {
+            edge
+            for edge in batch - own
+            if edge[0] in user_ids and edge[1] in user_ids
+        }
+        inserted = follow_many(db, valid)
+        imported += len(inserted)
+        existing += len(valid) - len(inserted)
+        self_follows += len(own)
+        unknown += len(batch - own - valid)
+    return imported, existing, self_follows, unknown
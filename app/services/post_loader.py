@@ -0,0 +1,379 @@
+from collections import defaultdict
+from typing import List, NamedTuple, Optional
+import os
+from fastapi import HTTPException
+from starlette import status
+from sqlalchemy import func, select
+from db import Posts, PostTags, Comments, CommentReply, Reactions, Users
+from schemes import (
+    PostResponse,
+    ReactionListResponse,
+    ReactionSummary,
+    GetComments,
+    GetReactions,
+    GetReplies,
+)
+from utils import load_environment, batched, fetch_in
+
+load_environment()
+BASE_URL = os.getenv("BASE_URL")
+
+
+class Expansion(NamedTuple):
+    reactions: bool = False
+    reactions_summary: bool = False
+    comments: bool = False
+    comment_limit: Optional[int] = None
+    # Whose reactions the summaries report back as ``viewer_reaction``.
+    viewer_id: Optional[int] = None
+
+
+FULL_EXPANSION = Expansion(reactions_summary=True, comments=True)
+
+EXPAND_DESCRIPTION = (
+    "Comma separated parts to include: all, none, reactions, reactions_summary, "
+    "comments or comments:N"
+)
+
+
+def parse_expand(expand: str, viewer_id: Optional[int] = None):
+    """Parse an ``expand`` query value such as ``reactions_summary,comments:3``.
+
+    ``all`` is the comment tree with per-type reaction counts, ``none`` is
+    the post fields and counters only, and ``comments:N`` limits each post
+    to its first N comments. Individual reactions are only listed with
+    ``reactions``. The viewer is only kept when summaries are requested, so
+    other expansions stay shared between users.
+    """
+    expansion = Expansion()
+
+    for part in filter(None, (part.strip() for part in expand.split(","))):
+        name, _, argument = part.partition(":")
+
+        if name == "all" and not argument:
+            expansion = expansion._replace(reactions_summary=True, comments=True)
+        elif name == "none" and not argument:
+            continue
+        elif name == "reactions" and not argument:
+            expansion = expansion._replace(reactions=True)
+        elif name == "reactions_summary" and not argument:
+            expansion = expansion._replace(reactions_summary=True)
+        elif name == "comments" and not argument:
+            expansion = expansion._replace(comments=True)
+        elif name == "comments" and argument.isdigit() and int(argument) > 0:
+            expansion = expansion._replace(comments=True, comment_limit=int(argument))
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid expand option '{part}'",
+            )
+
+    if expansion.reactions_summary and viewer_id is not None:
+        expansion = expansion._replace(viewer_id=viewer_id)
+
+    return expansion
+
+
+def _group_by(rows, key):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[getattr(row, key)].append(row)
+    return grouped
+
+
+def _reaction_columns(db):
+    return db.query(
+        Reactions.id,
+        Reactions.owner_id,
+        Reactions.post_id,
+        Reactions.comment_id,
+        Reactions.reply_id,
+        Reactions.reaction_type,
+    ).order_by(Reactions.id)
+
+
+def _summary_query(db):
+    """Reaction counts per type for each (post, comment, reply) target."""
+    target = (Reactions.post_id, Reactions.comment_id, Reactions.reply_id)
+    return db.query(*target, Reactions.reaction_type, func.count()).group_by(
+        *target, Reactions.reaction_type
+    )
+
+
+COMMENT_COLUMNS = (
+    Comments.id,
+    Comments.owner_id,
+    Comments.post_id,
+    Comments.content,
+    Comments.created_at,
+    Comments.reaction_count,
+    Comments.reply_count,
+)
+REPLY_COLUMNS = (
+    CommentReply.id,
+    CommentReply.owner_id,
+    CommentReply.post_id,
+    CommentReply.comment_id,
+    CommentReply.parent_id,
+    CommentReply.depth,
+    CommentReply.content,
+    CommentReply.created_at,
+    CommentReply.reaction_count,
+)
+
+
+def reply_subtree(root: CommentReply = None, depth: int = None):
+    """Criteria for the replies below ``root``, or in the whole thread.
+
+    A reply's descendants are the paths it prefixes, so with the comment id
+    this is one range on the (comment_id, path) index. ``depth`` keeps that
+    many levels, 1 being direct replies only.
+    """
+    criteria = []
+    base_depth = 0
+    if root is not None:
+        # "0" sorts right after "/", so this bounds every path under root.
+        criteria += [
+            CommentReply.path > root.path,
+            CommentReply.path < root.path[:-1] + "0",
+        ]
+        base_depth = root.depth + 1
+    if depth is not None:
+        criteria.append(CommentReply.depth < base_depth + depth)
+    return criteria
+
+
+def _fetch_children(
+    db, columns, parent_column, parent_ids, order_column, limit: int = None
+):
+    """Rows whose ``parent_column`` is in ``parent_ids``, by ``order_column``.
+
+    With ``limit`` only the first rows of each parent are kept, ranked by a
+    window function instead of one query per parent.
+    """
+    if limit is None:
+        return fetch_in(
+            db.query(*columns).order_by(order_column), parent_column, parent_ids
+        )
+
+    rows = []
+    for batch in batched(parent_ids):
+        ranked = (
+            select(
+                *columns,
+                func.row_number()
+                .over(partition_by=parent_column, order_by=order_column)
+                .label("position"),
+            )
+            .where(parent_column.in_(batch))
+            .subquery()
+        )
+        rows.extend(
+            db.query(*(ranked.c[column.key] for column in columns))
+            .filter(ranked.c.position <= limit)
+            .order_by(ranked.c[parent_column.key], ranked.c.position)
+            .all()
+        )
+    return rows
+
+
+def _usernames(db, user_ids):
+    return dict(fetch_in(db.query(Users.id, Users.username), Users.id, user_ids))
+
+
+class _TargetReactions:
+    """What ``expand`` asks for about the reactions on a set of targets.
+
+    Everything is keyed by (post_id, comment_id, reply_id), which every
+    reaction row carries.
+    """
+
+    def __init__(self, expand: Expansion):
+        self.expand = expand
+        self.rows = defaultdict(list)
+        self.summaries = defaultdict(dict)
+        self.viewer_reactions = {}
+
+    def load(self, db, column, ids, *criteria):
+        """Load the reactions whose ``column`` is in ``ids``."""
+        if self.expand.reactions:
+            for row in fetch_in(_reaction_columns(db).filter(*criteria), column, ids):
+                self.rows[(row.post_id, row.comment_id, row.reply_id)].append(row)
+
+        if self.expand.reactions_summary:
+            rows = fetch_in(_summary_query(db).filter(*criteria), column, ids)
+            for post_id, comment_id, reply_id, reaction_type, count in rows:
+                self.summaries[(post_id, comment_id, reply_id)][reaction_type] = count
+
+        if self.expand.viewer_id is not None:
+            rows = fetch_in(
+                db.query(
+                    Reactions.post_id,
+                    Reactions.comment_id,
+                    Reactions.reply_id,
+                    Reactions.reaction_type,
+                ).filter(Reactions.owner_id == self.expand.viewer_id, *criteria),
+                column,
+                ids,
+            )
+            for post_id, comment_id, reply_id, reaction_type in rows:
+                self.viewer_reactions[(post_id, comment_id, reply_id)] = reaction_type
+
+    def owner_ids(self):
+        return {row.owner_id for rows in self.rows.values() for row in rows}
+
+    def fields(self, key, usernames, reaction_model=GetReactions):
+        """The ``reactions`` and ``reactions_summary`` fields of one target."""
+        fields = {}
+        if self.expand.reactions:
+            fields["reactions"] = [
+                reaction_model(
+                    id=reaction.id,
+                    owner=usernames[reaction.owner_id],
+                    reaction_type=reaction.reaction_type,
+                )
+                for reaction in self.rows[key]
+            ]
+        if self.expand.reactions_summary:
+            summary = dict(counts=self.summaries[key])
+            if self.expand.viewer_id is not None:
+                summary["viewer_reaction"] = self.viewer_reactions.get(key)
+            fields["reactions_summary"] = ReactionSummary(**summary)
+        return fields
+
+
+def _reply_response(reply, usernames, reactions: _TargetReactions):
+    return GetReplies(
+        id=reply.id,
+        parent_id=reply.parent_id,
+        depth=reply.depth,
+        created_by=usernames[reply.owner_id],
+        reply_content=reply.content,
+        created_at=reply.created_at,
+        reaction_count=reply.reaction_count,
+        **reactions.fields((reply.post_id, reply.comment_id, reply.id), usernames),
+    )
+
+
+def load_reply_responses(db, replies, expand: Expansion = FULL_EXPANSION):
+    """Build GetReplies objects for reply rows selected with REPLY_COLUMNS."""
+    reactions = _TargetReactions(expand)
+    reactions.load(db, Reactions.reply_id, [reply.id for reply in replies])
+    usernames = _usernames(
+        db, {reply.owner_id for reply in replies} | reactions.owner_ids()
+    )
+    return [_reply_response(reply, usernames, reactions) for reply in replies]
+
+
+def load_comment_responses(
+    db, comments, expand: Expansion = FULL_EXPANSION, reply_limit: int = None
+):
+    """Build GetComments objects for comment rows selected with COMMENT_COLUMNS.
+
+    Replies are fetched for all the comments at once, each thread flattened
+    in display order with ``parent_id`` and ``depth`` to nest it by.
+    ``reply_limit`` keeps the first N of each as a preview, with
+    ``reply_count`` still giving the total. Reactions are only loaded for
+    the comments themselves and the replies that are returned, so a
+    preview does not read the reactions of the whole thread.
+    """
+    comment_ids = [comment.id for comment in comments]
+    replies = _fetch_children(
+        db,
+        REPLY_COLUMNS,
+        CommentReply.comment_id,
+        comment_ids,
+        CommentReply.path,
+        reply_limit,
+    )
+    reactions = _TargetReactions(expand)
+    reactions.load(db, Reactions.comment_id, comment_ids, Reactions.reply_id.is_(None))
+    reactions.load(db, Reactions.reply_id, [reply.id for reply in replies])
+    usernames = _usernames(
+        db,
+        {row.owner_id for row in (*comments, *replies)} | reactions.owner_ids(),
+    )
+
+    replies_by_comment = _group_by(replies, "comment_id")
+    return [
+        GetComments(
+            id=comment.id,
+            created_by=usernames[comment.owner_id],
+            comment_content=comment.content,
+            created_at=comment.created_at,
+            reaction_count=comment.reaction_count,
+            reply_count=comment.reply_count,
+            reply=[
+                _reply_response(reply, usernames, reactions)
+                for reply in replies_by_comment[comment.id]
+            ],
+            **reactions.fields((comment.post_id, comment.id, None), usernames),
+        )
+        for comment in comments
+    ]
+
+
+def load_post_responses(db, posts: List[Posts], expand: Expansion = FULL_EXPANSION):
+    """Build PostResponse objects for a page of posts.
+
+    Only the parts named in ``expand`` are queried. Each part is fetched
+    with one batched IN (...) query and stitched together here, so the
+    number of rows read is linear in the data returned instead of the
+    cartesian product a nested joinedload produces. Parts that are not
+    expanded are left unset, so routes using ``response_model_exclude_unset``
+    do not serialize them.
+    """
+    post_ids = [post.id for post in posts]
+
+    tagged_users = defaultdict(list)
+    tag_rows = fetch_in(
+        db.query(PostTags.post_id, Users.username)
+        .join(Users, Users.id == PostTags.user_id)
+        .order_by(PostTags.id),
+        PostTags.post_id,
+        post_ids,
+    )
+    for post_id, username in tag_rows:
+        tagged_users[post_id].append(username)
+
+    reactions = _TargetReactions(expand)
+    reactions.load(
+        db,
+        Reactions.post_id,
+        post_ids,
+        Reactions.comment_id.is_(None),
+        Reactions.reply_id.is_(None),
+    )
+    usernames = _usernames(db, reactions.owner_ids())
+
+    comments_by_post = defaultdict(list)
+    if expand.comments:
+        comments = _fetch_children(
+            db,
+            COMMENT_COLUMNS,
+            Comments.post_id,
+            post_ids,
+            Comments.id,
+            expand.comment_limit,
+        )
+        comment_responses = load_comment_responses(db, comments, expand)
+        for comment, response in zip(comments, comment_responses):
+            comments_by_post[comment.post_id].append(response)
+
+    def post_response(post):
+        fields = dict(
+            id=post.id,
+            created_by=post.created_by,
+            tagged_users=tagged_users[post.id],
+            post_content=post.content,
+            image_url=f"{BASE_URL}/static/{post.image_url or 'avatar.png'}",
+            created_at=post.created_at,
+            reaction_count=post.reaction_count,
+            comment_count=post.comment_count,
+            **reactions.fields((post.id, None, None), usernames, ReactionListResponse),
+        )
+        if expand.comments:
+            fields["comments"] = comments_by_post[post.id]
+        return PostResponse(**fields)
+
+    return [post_response(post) for post in posts]
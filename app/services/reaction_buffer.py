@@ -0,0 +1,138 @@
+import asyncio
+import os
+from starlette.concurrency import run_in_threadpool
+from db import SessionLocal
+from utils import load_environment
+from .cache_service import invalidate_post
+from .reaction_service import write_reactions
+from .trending_service import record_reaction
+
+load_environment()
+
+# "immediate" commits every reaction in its own request. "buffered" queues
+# them and commits everything queued every REACTION_FLUSH_INTERVAL_MS.
+REACTION_WRITE_MODE = os.getenv("REACTION_WRITE_MODE", "immediate")
+REACTION_BUFFERING = REACTION_WRITE_MODE == "buffered"
+REACTION_FLUSH_INTERVAL_MS = float(os.getenv("REACTION_FLUSH_INTERVAL_MS", "5"))
+# "commit": a buffered write is answered once its batch is committed.
+# "accepted": it is answered once queued, so a crash can lose the writes
+# of the last interval.
+REACTION_DURABILITY = os.getenv("REACTION_DURABILITY", "commit")
+
+
+def _write_batch(batch):
+    db = SessionLocal()
+    try:
+        applied = write_reactions(db, batch)
+        db.commit()
+    finally:
+        db.close()
+
+    for _, post_id, _, _ in applied:
+        invalidate_post(post_id)
+    for key in applied:
+        if batch[key] is not None:
+            record_reaction(key[1])
+    return applied
+
+
+class ReactionBuffer:
+    """Reaction writes queued and committed together in one transaction.
+
+    Writes are keyed by (owner, post, comment, reply), so a user's repeated
+    writes to one target before a flush collapse to the last. A flush
+    starts one interval after the first write it holds and waits for the
+    previous flush, so batches are applied in order.
+    """
+
+    def __init__(self, flush_interval_seconds: float):
+        self.flush_interval_seconds = flush_interval_seconds
+        self._pending = {}
+        self._pending_owners = set()
+        self._pending_flush = None
+        self._flushing = {}
+        self._flushing_owners = set()
+        self._last_flush = None
+
+    def queued(self, owner_id: int, post_id: int, comment_id=None, reply_id=None):
+        """(True, reaction_type) if a write is queued, where None clears."""
+        key = (owner_id, post_id, comment_id, reply_id)
+        for batch in (self._pending, self._flushing):
+            if key in batch:
+                return True, batch[key]
+        return False, None
+
+    def submit(
+        self, owner_id: int, reaction_type, post_id: int, comment_id, reply_id
+    ):
+        """Queue a write. Returns the flush task that will commit it."""
+        self._pending[(owner_id, post_id, comment_id, reply_id)] = reaction_type
+        self._pending_owners.add(owner_id)
+        if self._pending_flush is None:
+            self._pending_flush = asyncio.create_task(self._flush(self._last_flush))
+            self._last_flush = self._pending_flush
+        return self._pending_flush
+
+    async def wait_for_owner(self, owner_id: int):
+        """Return once every write queued by ``owner_id`` is committed."""
+        if owner_id in self._pending_owners or owner_id in self._flushing_owners:
+            await asyncio.wait([self._last_flush])
+
+    async def drain(self):
+        if self._last_flush is not None:
+            await asyncio.wait([self._last_flush])
+
+    async def _flush(self, previous):
+        await asyncio.sleep(self.flush_interval_seconds)
+        if previous is not None:
+            await asyncio.wait([previous])
+
+        self._flushing, self._pending = self._pending, {}
+        self._flushing_owners, self._pending_owners = self._pending_owners, set()
+        self._pending_flush = None
+        try:
+            return await run_in_threadpool(_write_batch, self._flushing)
+        finally:
+            self._flushing = {}
+            self._flushing_owners = set()
+
+
+reaction_buffer = ReactionBuffer(
+    flush_interval_seconds=REACTION_FLUSH_INTERVAL_MS / 1000
+)
+
+
+def queued_reaction(owner_id: int, post_id: int, comment_id=None, reply_id=None):
+    return reaction_buffer.queued(owner_id, post_id, comment_id, reply_id)
+
+
+async def buffer_reaction(
+    db, owner_id: int, reaction_type, post_id: int, comment_id=None, reply_id=None
+):
+    """Queue a reaction write, None clearing it.
+
+    Returns False if the target was gone when the batch was written. With
+    REACTION_DURABILITY=accepted it returns True as soon as the write is
+    queued, so callers should check the target first. The request's
+    session is closed here: the write no longer needs it, and requests
+    holding connections while a burst is queued would leave none in the
+    pool for the flush.
+    """
+    db.close()
+    flush = reaction_buffer.submit(
+        owner_id, reaction_type, post_id, comment_id, reply_id
+    )
+    if REACTION_DURABILITY == "accepted":
+        return True
+    applied = await asyncio.shield(flush)
+    return (owner_id, post_id, comment_id, reply_id) in applied
+
+
+async def wait_for_reactions(owner_id: int):
+    """Let a user read their own buffered reactions."""
+    await reaction_buffer.wait_for_owner(owner_id)
+
+
+async def flush_reactions():
+    """Commit every queued reaction, e.g. on shutdown."""
+    await reaction_buffer.drain()
@@ -0,0 +1,291 @@
+from sqlalchemy import and_, literal, null, select, tuple_
+from sqlalchemy.dialects.sqlite import insert
+from starlette import status
+from constants import ReactionType
+from db import Posts, Comments, CommentReply, Reactions
+from schemes import ReactionBatchResult
+
+
+def reaction_target(post_id: int, comment_id: int = None, reply_id: int = None):
+    """Filter criteria for the reactions on one post, comment or reply."""
+    return (
+        Reactions.post_id == post_id,
+        (
+            Reactions.comment_id.is_(None)
+            if comment_id is None
+            else Reactions.comment_id == comment_id
+        ),
+        (
+            Reactions.reply_id.is_(None)
+            if reply_id is None
+            else Reactions.reply_id == reply_id
+        ),
+    )
+
+
+def _existing_target(post_id: int, comment_id: int = None, reply_id: int = None):
+    """Columns and criteria reading a target's (post, comment, reply) ids."""
+    if reply_id is not None:
+        columns = (CommentReply.post_id, CommentReply.comment_id, CommentReply.id)
+        criteria = (
+            CommentReply.id == reply_id,
+            CommentReply.comment_id == comment_id,
+            CommentReply.post_id == post_id,
+        )
+    elif comment_id is not None:
+        columns = (Comments.post_id, Comments.id, null())
+        criteria = (Comments.id == comment_id, Comments.post_id == post_id)
+    else:
+        columns = (Posts.id, null(), null())
+        criteria = (Posts.id == post_id,)
+    return columns, criteria
+
+
+def _target_column(comment_id: int = None, reply_id: int = None):
+    """The column naming a reaction's target: its reply, comment or post."""
+    if reply_id is not None:
+        return Reactions.reply_id
+    if comment_id is not None:
+        return Reactions.comment_id
+    return Reactions.post_id
+
+
+def _level_criteria(target_column):
+    """Predicate of the unique reaction index for ``target_column``'s level."""
+    if target_column.key == "reply_id":
+        return Reactions.reply_id.isnot(None)
+    if target_column.key == "comment_id":
+        return and_(Reactions.comment_id.isnot(None), Reactions.reply_id.is_(None))
+    return and_(Reactions.comment_id.is_(None), Reactions.reply_id.is_(None))
+
+
+def _insert_reaction(
+    owner_id: int,
+    reaction_type: ReactionType,
+    post_id: int,
+    comment_id: int = None,
+    reply_id: int = None,
+):
+    """INSERT ... SELECT of a reaction, reading its target ids from the target."""
+    columns, criteria = _existing_target(post_id, comment_id, reply_id)
+    return insert(Reactions).from_select(
+        ["owner_id", "post_id", "comment_id", "reply_id", "reaction_type"],
+        select(
+            literal(owner_id),
+            *columns,
+            literal(reaction_type, Reactions.reaction_type.type),
+        ).where(*criteria),
+    )
+
+
+def _upsert(statement, target_column):
+    return statement.on_conflict_do_update(
+        index_elements=[Reactions.owner_id, target_column],
+        index_where=_level_criteria(target_column),
+        set_={"reaction_type": statement.excluded.reaction_type},
+    )
+
+
+def set_reaction(
+    db,
+    owner_id: int,
+    reaction_type: ReactionType,
+    post_id: int,
+    comment_id: int = None,
+    reply_id: int = None,
+):
+    """Add or change a user's reaction on a target in one statement.
+
+    The insert reads its target columns from the post, comment or reply
+    row, so a missing target or a comment outside the post inserts nothing.
+    An existing reaction from the user has its type replaced instead.
+    Returns False when the target does not exist.
+    """
+    statement = _insert_reaction(owner_id, reaction_type, post_id, comment_id, reply_id)
+    statement = _upsert(statement, _target_column(comment_id, reply_id))
+
+    return db.execute(statement).rowcount > 0
+
+
+def add_reaction(
+    db,
+    owner_id: int,
+    reaction_type: ReactionType,
+    post_id: int,
+    comment_id: int = None,
+    reply_id: int = None,
+):
+    """Add a user's reaction on a target unless they already have one.
+
+    Like ``set_reaction``, but an existing reaction is left as it is, so
+    concurrent adds by one user never fail on the unique index. Returns
+    False when nothing was inserted.
+    """
+    statement = _insert_reaction(owner_id, reaction_type, post_id, comment_id, reply_id)
+    target_column = _target_column(comment_id, reply_id)
+    statement = statement.on_conflict_do_nothing(
+        index_elements=[Reactions.owner_id, target_column],
+        index_where=_level_criteria(target_column),
+    )
+
+    return db.execute(statement).rowcount > 0
+
+
+def clear_reaction(
+    db, owner_id: int, post_id: int, comment_id: int = None, reply_id: int = None
+):
+    """Remove a user's reaction on a target. Returns False if there was none."""
+    deleted = (
+        db.query(Reactions)
+        .filter(
+            Reactions.owner_id == owner_id,
+            *reaction_target(post_id, comment_id, reply_id),
+        )
+        .delete(synchronize_session=False)
+    )
+    return deleted > 0
+
+
+def _operation_target(operation):
+    return operation.post_id, operation.comment_id, operation.reply_id
+
+
+def _existing_targets(db, targets):
+    """The (post, comment, reply) targets in ``targets`` that exist.
+
+    One IN (...) query per level, whatever the number of targets.
+    """
+    post_ids = {
+        post for post, comment, reply in targets if comment is None and reply is None
+    }
+    comment_ids = {
+        comment
+        for post, comment, reply in targets
+        if comment is not None and reply is None
+    }
+    reply_ids = {reply for post, comment, reply in targets if reply is not None}
+
+    existing = set()
+    if post_ids:
+        existing.update(
+            (row.id, None, None)
+            for row in db.query(Posts.id).filter(Posts.id.in_(post_ids))
+        )
+    if comment_ids:
+        existing.update(
+            (row.post_id, row.id, None)
+            for row in db.query(Comments.post_id, Comments.id).filter(
+                Comments.id.in_(comment_ids)
+            )
+        )
+    if reply_ids:
+        existing.update(
+            (row.post_id, row.comment_id, row.id)
+            for row in db.query(
+                CommentReply.post_id, CommentReply.comment_id, CommentReply.id
+            ).filter(CommentReply.id.in_(reply_ids))
+        )
+    return existing
+
+
+def write_reactions(db, reactions):
+    """Apply many users' reactions without committing.
+
+    ``reactions`` maps (owner_id, post_id, comment_id, reply_id) to a
+    reaction type, or None to clear it. Targets are checked with one query
+    per level and keys whose target does not exist are skipped. The rest
+    are written with one upsert and one delete per level. Returns the keys
+    that were applied.
+    """
+    existing = _existing_targets(db, {key[1:] for key in reactions})
+
+    applied = set()
+    upserts = {}
+    deletes = {}
+    for key, reaction_type in reactions.items():
+        owner_id, post_id, comment_id, reply_id = key
+        if key[1:] not in existing:
+            continue
+
+        applied.add(key)
+        column = _target_column(comment_id, reply_id)
+        if reaction_type is None:
+            target_id = {
+                "post_id": post_id,
+                "comment_id": comment_id,
+                "reply_id": reply_id,
+            }[column.key]
+            deletes.setdefault(column.key, (column, []))[1].append(
+                (owner_id, target_id)
+            )
+        else:
+            upserts.setdefault(column.key, (column, []))[1].append(
+                {
+                    "owner_id": owner_id,
+                    "post_id": post_id,
+                    "comment_id": comment_id,
+                    "reply_id": reply_id,
+                    "reaction_type": reaction_type,
+                }
+            )
+
+    for column, rows in upserts.values():
+        db.execute(_upsert(insert(Reactions), column), rows)
+    for column, targets in deletes.values():
+        db.query(Reactions).filter(
+            _level_criteria(column),
+            tuple_(Reactions.owner_id, column).in_(targets),
+        ).delete(synchronize_session=False)
+
+    return applied
+
+
+def apply_reaction_batch(db, owner_id: int, operations):
+    """Set or clear a user's reactions on many targets without committing.
+
+    Unknown targets are reported as 404 without failing the others, and
+    when several operations name the same target the last one wins.
+    Everything is written by ``write_reactions``, so the caller commits
+    the whole batch at once. Returns a ``ReactionBatchResult`` per
+    operation.
+    """
+    reactions = {
+        (owner_id, *_operation_target(operation)): operation.reaction_type
+        for operation in operations
+    }
+    applied = write_reactions(db, reactions)
+
+    results = []
+    for index, operation in enumerate(operations):
+        if (owner_id, *_operation_target(operation)) not in applied:
+            results.append(
+                ReactionBatchResult(
+                    index=index,
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Reaction target not found",
+                )
+            )
+            continue
+
+        results.append(
+            ReactionBatchResult(
+                index=index,
+                status_code=status.HTTP_200_OK,
+                detail=(
+                    "Reaction cleared"
+                    if operation.reaction_type is None
+                    else "Reaction saved"
+                ),
+                reaction_type=operation.reaction_type,
+            )
+        )
+
+    return results
+
+
+def reaction_target_exists(
+    db, post_id: int, comment_id: int = None, reply_id: int = None
+):
+    return (post_id, comment_id, reply_id) in _existing_targets(
+        db, {(post_id, comment_id, reply_id)}
+    )
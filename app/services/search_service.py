@@ -0,0 +1,109 @@
+from collections import defaultdict
+from fastapi import HTTPException
+from sqlalchemy import bindparam, text
+from starlette import status
+from constants import SearchKind
+from schemes import SearchResult
+from utils import encode_cursor_values, decode_cursor_values, cursor_row_id
+
+# Search index and source table for each kind of result; see db/schema.py.
+SEARCH_SOURCES = {
+    SearchKind.POST: ("posts_fts", "posts", "id"),
+    SearchKind.COMMENT: ("comments_fts", "comments", "post_id"),
+    SearchKind.REPLY: ("comment_replies_fts", "comment_replies", "post_id"),
+}
+SNIPPET_TOKENS = 16
+
+
+def _decode_cursor(cursor: str):
+    return decode_cursor_values(
+        cursor, float, lambda kind: SearchKind(kind).value, cursor_row_id
+    )
+
+
+def _match_query(q: str):
+    """Quote every word so user input is never parsed as FTS5 query syntax."""
+    terms = q.split()
+    if not terms:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Search query is empty"
+        )
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _ranked_page(db, match: str, limit: int, cursor: str = None):
+    ranked = " UNION ALL ".join(
+        f"SELECT '{kind.value}' AS kind, rowid AS id, rank FROM {search_table} "
+        f"WHERE {search_table} MATCH :match"
+        for kind, (search_table, _, _) in SEARCH_SOURCES.items()
+    )
+    after = ""
+    params = {"match": match, "limit": limit + 1}
+    if cursor:
+        params["rank"], params["kind"], params["id"] = _decode_cursor(cursor)
+        after = "WHERE (rank, kind, id) > (:rank, :kind, :id)"
+
+    return db.execute(
+        text(
+            f"SELECT kind, id, rank FROM ({ranked}) {after} "
+            "ORDER BY rank, kind, id LIMIT :limit"
+        ),
+        params,
+    ).all()
+
+
+def _load_results(db, match: str, kind: SearchKind, ids):
+    search_table, table, post_column = SEARCH_SOURCES[kind]
+    query = text(
+        f"""
+        SELECT
+            {search_table}.rowid AS id,
+            {table}.{post_column} AS post_id,
+            users.username AS created_by,
+            {table}.created_at AS created_at,
+            snippet({search_table}, 0, '<mark>', '</mark>', '…', {SNIPPET_TOKENS})
+                AS snippet
+        FROM {search_table}
+        JOIN {table} ON {table}.id = {search_table}.rowid
+        JOIN users ON users.id = {table}.owner_id
+        WHERE {search_table} MATCH :match AND {search_table}.rowid IN :ids
+        """
+    ).bindparams(bindparam("ids", expanding=True))
+
+    return {
+        row.id: SearchResult(kind=kind, **row._mapping)
+        for row in db.execute(query, {"match": match, "ids": list(ids)})
+    }
+
+
+def search(db, q: str, limit: int, cursor: str = None):
+    """Rank posts, comments and replies matching ``q`` by BM25.
+
+    The ranking query only reads the search indexes. Snippets, authors and
+    post ids are then loaded for the rows on the page, one query per kind.
+    Pages continue after ``cursor`` on (rank, kind, id).
+    """
+    match = _match_query(q)
+    rows = _ranked_page(db, match, limit, cursor)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor_values(last.rank, last.kind, last.id)
+
+    ids_by_kind = defaultdict(list)
+    for row in rows:
+        ids_by_kind[SearchKind(row.kind)].append(row.id)
+
+    loaded = {
+        kind: _load_results(db, match, kind, ids)
+        for kind, ids in ids_by_kind.items()
+    }
+    results = [
+        loaded[SearchKind(row.kind)][row.id]
+        for row in rows
+        if row.id in loaded[SearchKind(row.kind)]
+    ]
+
+    return results, next_cursor
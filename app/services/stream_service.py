@@ -0,0 +1,42 @@
+from fastapi.responses import StreamingResponse
+from db import SessionLocal
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 200
+
+
+def wants_ndjson(accept: str = None):
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept
+
+
+def ndjson_response(query, serialize_batch, batch_size=STREAM_BATCH_SIZE):
+    """Stream the rows of ``query`` as newline-delimited JSON.
+
+    ``serialize_batch(db, rows)`` turns a batch of rows into response
+    models. Rows are read through a server-side cursor and the session is
+    cleared after every batch, so memory stays flat however large the
+    listing is. The stream outlives the request's session, so the query is
+    rebound to a session of its own.
+    """
+
+    def lines():
+        db = SessionLocal()
+        try:
+            batch = []
+            for row in query.with_session(db).yield_per(batch_size):
+                batch.append(row)
+                if len(batch) == batch_size:
+                    yield from _serialize(db, serialize_batch, batch)
+                    batch = []
+            if batch:
+                yield from _serialize(db, serialize_batch, batch)
+        finally:
+            db.close()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def _serialize(db, serialize_batch, rows):
+    for item in serialize_batch(db, rows):
+        yield item.model_dump_json(exclude_unset=True) + "\n"
+    db.expunge_all()
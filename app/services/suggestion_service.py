@@ -0,0 +1,135 @@
+from collections import Counter
+from sqlalchemy import func, select
+from db import Reactions, Users
+from schemes import UserSuggestion
+from .cache_service import ResponseCache
+from .follow_graph import get_follow_graph
+
+# A mutual follow counts for more than reacting to the same thing.
+MUTUAL_FOLLOW_WEIGHT = 1.0
+SHARED_REACTION_WEIGHT = 0.5
+# Only a user's most recent reactions are compared with everyone else's.
+SUGGESTION_REACTION_SAMPLE = 200
+# Candidates kept per user; the endpoint's largest page.
+SUGGESTION_CACHE_SIZE = 100
+SUGGESTION_CACHE_MAX_ENTRIES = 1024
+SUGGESTION_CACHE_TTL_SECONDS = 300
+
+suggestion_cache = ResponseCache(
+    max_entries=SUGGESTION_CACHE_MAX_ENTRIES,
+    ttl_seconds=SUGGESTION_CACHE_TTL_SECONDS,
+)
+
+
+def _suggestions_tag(user_id: int):
+    return f"suggestions:{user_id}"
+
+
+def _followed_tag(user_id: int):
+    """Tag of every ranking that goes through ``user_id``'s follows."""
+    return f"suggestions:via:{user_id}"
+
+
+def _mutual_follows(follow_graph, user_id: int):
+    """Two-hop follow counts: how many followed users follow each account.
+
+    The user's row of the adjacency matrix times the matrix, one sorted
+    following list per followed user, so the cost is the size of the
+    two-hop neighbourhood rather than of the graph.
+    """
+    mutual = Counter()
+    for followed_id in follow_graph.following(user_id):
+        mutual.update(follow_graph.following(followed_id))
+    return mutual
+
+
+def _shared_reactions(db, user_id: int):
+    """How many of the user's recent reaction targets each account shares."""
+    recent = (
+        select(Reactions.post_id, Reactions.comment_id, Reactions.reply_id)
+        .where(Reactions.owner_id == user_id)
+        .order_by(Reactions.id.desc())
+        .limit(SUGGESTION_REACTION_SAMPLE)
+        .subquery()
+    )
+    return Counter(
+        dict(
+            db.query(Reactions.owner_id, func.count())
+            .join(
+                recent,
+                (Reactions.post_id == recent.c.post_id)
+                & Reactions.comment_id.is_not_distinct_from(recent.c.comment_id)
+                & Reactions.reply_id.is_not_distinct_from(recent.c.reply_id),
+            )
+            .filter(Reactions.owner_id != user_id)
+            .group_by(Reactions.owner_id)
+            .all()
+        )
+    )
+
+
+def _rank_suggestions(db, follow_graph, user_id: int):
+    mutual = _mutual_follows(follow_graph, user_id)
+    shared = _shared_reactions(db, user_id)
+
+    candidates = [
+        candidate_id
+        for candidate_id in mutual.keys() | shared.keys()
+        if candidate_id != user_id and not follow_graph.follows(user_id, candidate_id)
+    ]
+    candidates.sort(
+        key=lambda candidate_id: (
+            -(
+                mutual[candidate_id] * MUTUAL_FOLLOW_WEIGHT
+                + shared[candidate_id] * SHARED_REACTION_WEIGHT
+            ),
+            candidate_id,
+        )
+    )
+
+    # Over-fetch, since accounts deleted meanwhile are dropped below.
+    candidates = candidates[: SUGGESTION_CACHE_SIZE * 2]
+    usernames = dict(
+        db.query(Users.id, Users.username).filter(Users.id.in_(candidates))
+    )
+    return [
+        UserSuggestion(
+            user_id=candidate_id,
+            username=usernames[candidate_id],
+            mutual_follows=mutual[candidate_id],
+            shared_reactions=shared[candidate_id],
+        )
+        for candidate_id in candidates
+        if candidate_id in usernames
+    ][:SUGGESTION_CACHE_SIZE]
+
+
+def get_suggestions(db, user_id: int, limit: int):
+    """Accounts ``user_id`` doesn't follow, best first.
+
+    Ranked by mutual follows and reactions on the same posts, comments and
+    replies. Rankings are cached per user and dropped when a follow
+    changes the user's two-hop neighbourhood.
+    """
+    suggestions = suggestion_cache.get(user_id)
+    if suggestions is None:
+        follow_graph = get_follow_graph(db)
+        suggestions = _rank_suggestions(db, follow_graph, user_id)
+        tags = {_suggestions_tag(user_id)}
+        tags.update(
+            _followed_tag(followed_id)
+            for followed_id in follow_graph.following(user_id)
+        )
+        suggestion_cache.set(user_id, suggestions, tags)
+    return suggestions[:limit]
+
+
+def invalidate_suggestions(follower_id: int):
+    """``follower_id`` followed or unfollowed someone.
+
+    Their own ranking changes, and so does every ranking that counts their
+    follows as the second hop, i.e. those of their followers.
+    """
+    suggestion_cache.invalidate(
+        _suggestions_tag(follower_id), _followed_tag(follower_id)
+    )
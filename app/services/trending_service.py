@@ -0,0 +1,231 @@
+import asyncio
+import heapq
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy import DateTime, bindparam, text
+from starlette.concurrency import run_in_threadpool
+from db import SessionLocal, TrendingPosts
+
+# An event counts half as much after this long.
+TRENDING_HALF_LIFE_SECONDS = 6 * 60 * 60
+REACTION_WEIGHT = 1.0
+REPLY_WEIGHT = 2.0
+COMMENT_WEIGHT = 3.0
+# Posts whose decayed score falls below this are dropped from memory.
+TRENDING_MIN_SCORE = 0.01
+# How often each worker merges its activity into trending_posts.
+TRENDING_PERSIST_INTERVAL_SECONDS = 60
+
+
+class TrendingScores:
+    """Per-post activity scores with exponential time decay.
+
+    Decaying every score on every tick would touch every post. Instead each
+    event adds ``weight * exp(rate * (t - epoch))``: every stored score
+    decays at the same rate, so their order never changes and the real
+    score at any time is the stored one scaled by ``exp(-rate * (now -
+    epoch))``. An event is O(1) and nothing is recomputed on reads. The
+    epoch is moved forward before the exponent grows large enough to
+    overflow.
+    """
+
+    MAX_EXPONENT = 300
+
+    def __init__(self, half_life_seconds: float):
+        self.rate = math.log(2) / half_life_seconds
+        self._epoch = time.time()
+        self._scores = {}
+        self._lock = threading.Lock()
+
+    def record(self, post_id: int, weight: float, at: float = None):
+        at = time.time() if at is None else at
+        with self._lock:
+            if self.rate * (at - self._epoch) > self.MAX_EXPONENT:
+                self._rebase(at)
+            growth = math.exp(self.rate * (at - self._epoch))
+            self._scores[post_id] = self._scores.get(post_id, 0.0) + weight * growth
+
+    def scores(self, now: float = None, clear=False):
+        """Every score as (post_id, score at ``now``), emptied with ``clear``."""
+        now = time.time() if now is None else now
+        with self._lock:
+            decay = math.exp(-self.rate * (now - self._epoch))
+            scores = [
+                (post_id, score * decay) for post_id, score in self._scores.items()
+            ]
+            if clear:
+                self._scores = {}
+        return scores
+
+    def replace(self, other: "TrendingScores"):
+        """Take over the scores of ``other``, which has the same rate."""
+        with other._lock:
+            epoch, scores = other._epoch, dict(other._scores)
+        with self._lock:
+            self._epoch, self._scores = epoch, scores
+
+    def forget(self, post_id: int):
+        with self._lock:
+            self._scores.pop(post_id, None)
+
+    def top(self, k: int, now: float = None):
+        """The ``k`` highest scoring posts as (post_id, score at ``now``)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            ranked = heapq.nlargest(k, self._scores.items(), key=lambda item: item[1])
+            decay = math.exp(-self.rate * (now - self._epoch))
+        return [(post_id, score * decay) for post_id, score in ranked]
+
+    def prune(self, min_score: float, now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            threshold = min_score * math.exp(self.rate * (now - self._epoch))
+            self._scores = {
+                post_id: score
+                for post_id, score in self._scores.items()
+                if score >= threshold
+            }
+
+    def clear(self):
+        with self._lock:
+            self._scores.clear()
+
+    def _rebase(self, epoch: float):
+        decay = math.exp(-self.rate * (epoch - self._epoch))
+        self._scores = {
+            post_id: score * decay for post_id, score in self._scores.items()
+        }
+        self._epoch = epoch
+
+
+# The ranking served by this worker: the last merged ranking read from
+# trending_posts plus this worker's activity since.
+trending_scores = TrendingScores(half_life_seconds=TRENDING_HALF_LIFE_SECONDS)
+# This worker's activity not yet merged into trending_posts.
+pending_scores = TrendingScores(half_life_seconds=TRENDING_HALF_LIFE_SECONDS)
+
+
+def _record(post_id: int, weight: float):
+    at = time.time()
+    trending_scores.record(post_id, weight, at)
+    pending_scores.record(post_id, weight, at)
+
+
+def record_reaction(post_id: int):
+    _record(post_id, REACTION_WEIGHT)
+
+
+def record_comment(post_id: int):
+    _record(post_id, COMMENT_WEIGHT)
+
+
+def record_reply(post_id: int):
+    _record(post_id, REPLY_WEIGHT)
+
+
+def forget_trending_post(post_id: int):
+    trending_scores.forget(post_id)
+    pending_scores.forget(post_id)
+
+
+def get_trending_post_ids(limit: int):
+    return [post_id for post_id, _ in trending_scores.top(limit)]
+
+
+# Adds a worker's activity to a post's persisted score, decaying that score
+# to the new computed_at first. Posts deleted meanwhile are skipped.
+MERGE_TRENDING = text(
+    """
+    INSERT INTO trending_posts (post_id, score, computed_at)
+    SELECT id, :score, :computed_at FROM posts WHERE id = :post_id
+    ON CONFLICT (post_id) DO UPDATE SET
+        score = excluded.score + trending_posts.score * exp(
+            :rate * 86400 * (
+                julianday(trending_posts.computed_at) - julianday(excluded.computed_at)
+            )
+        ),
+        computed_at = excluded.computed_at
+    """
+).bindparams(bindparam("computed_at", type_=DateTime))
+
+PRUNE_TRENDING = text(
+    """
+    DELETE FROM trending_posts
+    WHERE score * exp(
+        :rate * 86400 * (julianday(computed_at) - julianday(:computed_at))
+    ) < :min_score
+    """
+).bindparams(bindparam("computed_at", type_=DateTime))
+
+
+def _persisted_scores(db):
+    scores = TrendingScores(half_life_seconds=TRENDING_HALF_LIFE_SECONDS)
+    for row in db.query(TrendingPosts):
+        computed_at = row.computed_at.replace(tzinfo=timezone.utc)
+        scores.record(row.post_id, row.score, computed_at.timestamp())
+    return scores
+
+
+def persist_trending():
+    """Merge this worker's activity into trending_posts and read it back.
+
+    Every worker adds only what it recorded since its last merge, so the
+    table accumulates the activity of all of them. The ranking served here
+    is then rebuilt from the table, picking up the other workers' activity.
+    """
+    now = time.time()
+    pending = pending_scores.scores(now, clear=True)
+    computed_at = datetime.fromtimestamp(now, timezone.utc)
+
+    db = SessionLocal()
+    try:
+        if pending:
+            db.execute(
+                MERGE_TRENDING,
+                [
+                    {
+                        "post_id": post_id,
+                        "score": score,
+                        "computed_at": computed_at,
+                        "rate": trending_scores.rate,
+                    }
+                    for post_id, score in pending
+                ],
+            )
+        db.execute(
+            PRUNE_TRENDING,
+            {
+                "computed_at": computed_at,
+                "rate": trending_scores.rate,
+                "min_score": TRENDING_MIN_SCORE,
+            },
+        )
+        db.commit()
+
+        merged = _persisted_scores(db)
+    finally:
+        db.close()
+
+    # Activity recorded while merging is only merged next time.
+    for post_id, score in pending_scores.scores():
+        merged.record(post_id, score)
+    trending_scores.replace(merged)
+
+
+def load_trending():
+    """Seed the in-memory scores from the persisted ranking."""
+    db = SessionLocal()
+    try:
+        trending_scores.replace(_persisted_scores(db))
+    finally:
+        db.close()
+
+
+async def run_trending_persistence():
+    """Load the persisted ranking, then write it back periodically."""
+    await run_in_threadpool(load_trending)
+    while True:
+        await asyncio.sleep(TRENDING_PERSIST_INTERVAL_SECONDS)
+        await run_in_threadpool(persist_trending)
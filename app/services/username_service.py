@@ -0,0 +1,106 @@
+from collections import OrderedDict
+import threading
+from typing import Iterable
+from constants import VersionedResource
+from db import Users
+from utils import batched
+from .version_service import get_versions
+
+USERNAME_CACHE_MAX_ENTRIES = 10_000
+
+
+class UsernameCache:
+    """Bounded LRU map of username to user id.
+
+    Only names that exist are cached, so registering a user never leaves a
+    stale miss behind. Renames and deletions bump the USERNAMES resource
+    version wherever they happen, and a version the cache hasn't seen
+    clears it. ``forget`` drops a name at once in the process that made
+    the change.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._ids = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def sync(self, db):
+        """Clear the cache if usernames changed since it was filled."""
+        (version,) = get_versions(db, VersionedResource.USERNAMES)
+        with self._lock:
+            if version != self._version:
+                self._ids.clear()
+                self._version = version
+
+    def get(self, username: str):
+        with self._lock:
+            user_id = self._ids.get(username)
+            if user_id is not None:
+                self._ids.move_to_end(username)
+            return user_id
+
+    def set(self, username: str, user_id: int):
+        with self._lock:
+            self._ids[username] = user_id
+            self._ids.move_to_end(username)
+            while len(self._ids) > self.max_entries:
+                self._ids.popitem(last=False)
+
+    def forget(self, *usernames: str):
+        with self._lock:
+            for username in usernames:
+                self._ids.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+username_cache = UsernameCache(max_entries=USERNAME_CACHE_MAX_ENTRIES)
+
+
+def resolve_usernames(db, usernames: Iterable[str]):
+    """Map usernames to user ids, leaving out names that do not exist.
+
+    Cached names are answered from memory and the rest are looked up with
+    one IN (...) query per batch.
+    """
+    username_cache.sync(db)
+    user_ids = {}
+    missing = []
+    for username in dict.fromkeys(usernames):
+        user_id = username_cache.get(username)
+        if user_id is None:
+            missing.append(username)
+        else:
+            user_ids[username] = user_id
+
+    for batch in batched(missing):
+        rows = db.query(Users.username, Users.id).filter(Users.username.in_(batch))
+        for username, user_id in rows:
+            username_cache.set(username, user_id)
+            user_ids[username] = user_id
+
+    return user_ids
+
+
+def get_user_by_username(db, username: str):
+    """Load a user by username, by primary key when the id is cached."""
+    username_cache.sync(db)
+    user_id = username_cache.get(username)
+    if user_id is not None:
+        user = db.get(Users, user_id)
+        if user is not None and user.username == username:
+            return user
+        username_cache.forget(username)
+
+    user = db.query(Users).filter(Users.username == username).first()
+    if user is not None:
+        username_cache.set(user.username, user.id)
+    return user
+
+
+def forget_usernames(*usernames: str):
+    """A user was renamed or deleted."""
+    username_cache.forget(*usernames)
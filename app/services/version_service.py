@@ -0,0 +1,30 @@
+import hashlib
+from fastapi import Response
+from starlette import status
+from db import ResourceVersions
+
+
+def get_versions(db, *resources):
+    versions = dict(
+        db.query(ResourceVersions.name, ResourceVersions.version)
+        .filter(ResourceVersions.name.in_(resources))
+        .all()
+    )
+    return tuple(versions.get(resource, 0) for resource in resources)
+
+
+def make_etag(*parts):
+    """Strong ETag over everything a response was built from."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str):
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def not_modified_response(etag: str):
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -9,3 +9,15 @@ from .selectors import (
     get_reaction_or_404,
     get_existing_reaction,
 )
+from .pagination import (
+    encode_cursor,
+    decode_cursor,
+    encode_cursor_values,
+    decode_cursor_values,
+    cursor_row_id,
+    keyset_order,
+    paginate,
+    paginate_by_id,
+    paginate_by_key,
+)
+from .batching import BATCH_SIZE, batched, fetch_in
@@ -0,0 +1,19 @@
+from itertools import islice
+
+# Keeps every IN (...) list well under SQLite's bound-parameter limit.
+BATCH_SIZE = 500
+
+
+def batched(items, size: int = BATCH_SIZE):
+    """Split ``items`` into lists of at most ``size``, reading it lazily."""
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+def fetch_in(query, column, ids):
+    """The rows of ``query`` whose ``column`` is in ``ids``, one query per batch."""
+    rows = []
+    for batch in batched(ids):
+        rows.extend(query.filter(column.in_(batch)).all())
+    return rows
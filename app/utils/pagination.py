@@ -0,0 +1,141 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from starlette import status
+
+# Largest value of SQLite's 64-bit signed INTEGER.
+MAX_ROW_ID = 2**63 - 1
+
+
+def encode_cursor_values(*values):
+    payload = json.dumps(list(values)).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def _decode(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded))
+
+
+def _invalid_cursor():
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+    )
+
+
+def cursor_row_id(value):
+    """A row id, refusing values SQLite could not bind as an INTEGER."""
+    row_id = int(value)
+    if not 0 < row_id <= MAX_ROW_ID:
+        raise ValueError(f"Row id out of range: {row_id}")
+    return row_id
+
+
+def _text(value):
+    if not isinstance(value, str):
+        raise TypeError(f"Expected a string, got {type(value).__name__}")
+    return value
+
+
+def decode_cursor_values(cursor: str, *parsers):
+    """Decode a cursor of one value per parser, each run through its parser.
+
+    A cursor that is malformed or holds values the query could not bind
+    is a 400.
+    """
+    try:
+        values = _decode(cursor)
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError("Wrong number of cursor values")
+        return tuple(parse(value) for parse, value in zip(parsers, values))
+    except (ValueError, TypeError, OverflowError):
+        raise _invalid_cursor()
+
+
+def encode_cursor(created_at: datetime, row_id: int):
+    return encode_cursor_values(created_at.isoformat(), row_id)
+
+
+def decode_cursor(cursor: str):
+    return decode_cursor_values(cursor, datetime.fromisoformat, cursor_row_id)
+
+
+def keyset_order(
+    query, created_at_column, id_column, cursor: str = None, oldest_first=False
+):
+    """Order a query newest first on (created_at, id), starting after ``cursor``.
+
+    ``oldest_first`` reverses the order, e.g. for comments in a thread.
+    """
+    key = tuple_(created_at_column, id_column)
+    if cursor:
+        after = decode_cursor(cursor)
+        query = query.filter(key > after if oldest_first else key < after)
+
+    if oldest_first:
+        return query.order_by(created_at_column, id_column)
+    return query.order_by(created_at_column.desc(), id_column.desc())
+
+
+def paginate(
+    query,
+    created_at_column,
+    id_column,
+    limit: int,
+    cursor: str = None,
+    oldest_first=False,
+):
+    """Keyset page over (created_at, id), newest first unless ``oldest_first``.
+
+    Returns the rows of the page and the cursor for the next one, or None
+    when the page is the last.
+    """
+    rows = (
+        keyset_order(query, created_at_column, id_column, cursor, oldest_first)
+        .limit(limit + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            getattr(last, created_at_column.key), getattr(last, id_column.key)
+        )
+
+    return rows, next_cursor
+
+
+def paginate_by_id(query, id_column, limit: int, cursor: str = None):
+    """Newest-first keyset page over ``id`` alone, for rows with no timestamp."""
+    if cursor:
+        (cursor_id,) = decode_cursor_values(cursor, cursor_row_id)
+        query = query.filter(id_column < cursor_id)
+
+    rows = query.order_by(id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor_values(getattr(rows[-1], id_column.key))
+
+    return rows, next_cursor
+
+
+def paginate_by_key(query, key_column, limit: int, cursor: str = None):
+    """Ascending keyset page over one unique text column, such as a reply's path."""
+    if cursor:
+        (cursor_key,) = decode_cursor_values(cursor, _text)
+        query = query.filter(key_column > cursor_key)
+
+    rows = query.order_by(key_column).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor_values(getattr(rows[-1], key_column.key))
+
+    return rows, next_cursor
@@ -59,40 +59,21 @@ def get_reaction_or_404(db, reaction_id: int, action: str):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Reaction to {action} not found"
         )
+    return query_reaction
 
 
 def get_existing_reaction(db, user_id, post_id=None, comment_id=None, reply_id=None):
-    if post_id:
-        return (
-            db.query(Reactions)
-            .filter(
-                Reactions.owner_id == user_id,
-                Reactions.post_id == post_id,
-                Reactions.comment_id == None,
-                Reactions.reply_id == None,
-            )
-            .first()
-        )
+    if reply_id:
+        target = (Reactions.reply_id == reply_id,)
     elif comment_id:
-        return (
-            db.query(Reactions)
-            .filter(
-                Reactions.owner_id == user_id,
-                Reactions.comment_id == comment_id,
-                Reactions.post_id == None,
-                Reactions.reply_id == None,
-            )
-            .first()
-        )
-    elif reply_id:
-        return (
-            db.query(Reactions)
-            .filter(
-                Reactions.owner_id == user_id,
-                Reactions.reply_id == reply_id,
-                Reactions.post_id == None,
-                Reactions.comment_id == None,
-            )
-            .first()
+        target = (Reactions.comment_id == comment_id, Reactions.reply_id == None)
+    elif post_id:
+        target = (
+            Reactions.post_id == post_id,
+            Reactions.comment_id == None,
+            Reactions.reply_id == None,
         )
-    return None
+    else:
+        return None
+
+    return db.query(Reactions).filter(Reactions.owner_id == user_id, *target).first()